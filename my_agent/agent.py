@@ -7,6 +7,7 @@ from my_agent.utils.orchestrator_nodes import (
     route_to_agents_node,
     sql_agent_node,
     nosql_agent_node,
+    hybrid_agents_node,
     data_engineer_node,
     aggregate_results_node,
     update_context_node,
@@ -27,6 +28,7 @@ def create_orchestrator_workflow():
     workflow.add_node("route_to_agents", route_to_agents_node)
     workflow.add_node("sql_agent", sql_agent_node)
     workflow.add_node("nosql_agent", nosql_agent_node)
+    workflow.add_node("hybrid_agents", hybrid_agents_node)
     workflow.add_node("data_engineer", data_engineer_node)
     workflow.add_node("aggregate_results", aggregate_results_node)
     workflow.add_node("update_context", update_context_node)
@@ -44,7 +46,7 @@ def create_orchestrator_workflow():
         {
             "sql_only": "sql_agent",
             "nosql_only": "nosql_agent", 
-            "both_agents": "sql_agent",
+            "both_agents": "hybrid_agents",
             "data_engineer": "data_engineer",  # Route unclear queries to Data Engineer
             "error_handling": "format_response"
         }
@@ -52,9 +54,10 @@ def create_orchestrator_workflow():
     
     # Add edges from agent nodes to aggregate_results
     workflow.add_edge("nosql_agent", "aggregate_results")
+    workflow.add_edge("hybrid_agents", "aggregate_results")
     workflow.add_edge("data_engineer", "aggregate_results")
     
-    # Add conditional edge for both_agents to route to nosql_agent after sql_agent
+    # A hybrid query routed to sql_only (NoSQL agent unavailable) still visits nosql_agent
     workflow.add_conditional_edges(
         "sql_agent",
         sql_agent_decision,
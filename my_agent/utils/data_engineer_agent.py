@@ -3,30 +3,210 @@ Data Engineer Agent for Handling Unclear, Irrelevant, and Technical Queries
 Provides professional guidance, query refinement, and context-aware responses
 """
 
-import json
+import asyncio
+import importlib.util
 import logging
-from typing import Dict, List, Any, Optional, Tuple
+import re
+import sys
+import time
+from dataclasses import dataclass, asdict
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, List, Any, Literal, Optional, Tuple
+from pydantic import BaseModel, Field, ValidationError
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate
 from my_agent.utils.state import QueryDomain, QueryIntent, QueryComplexity
-import os
-from dotenv import load_dotenv
+from my_agent.utils.semantic import embed_text, embed_texts, best_match
+from my_agent.utils.llm_cache import ResponseCache, PersistentResponseStore, open_response_store, count_tokens, hash_text, normalize_query, PROMPT_CACHE_MIN_TOKENS
+from my_agent.utils.llm_batch import BatchLLMClient, invoke_with_retry, run_sync
+from my_agent.utils import json_utils
+from my_agent.utils.env import OPENAI_KEY, POSTGRES_DB_URL, LLM_CACHE_PATH
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
+# Read-only analysis results shared by the non-LLM code paths
+_DEFAULT_ANALYSIS = MappingProxyType({
+    "is_clear": False,
+    "query_type": "ambiguous",
+    "domain_relevance": "none",
+    "complexity_level": "simple",
+    "confidence": 0.0,
+    "issues": ("Unable to analyze query",),
+    "suggested_domain": "none"
+})
+
+_DIRECT_SQL_ANALYSIS = MappingProxyType({
+    "is_clear": True,
+    "query_type": "clear",
+    "domain_relevance": "employee",
+    "complexity_level": "medium",
+    "confidence": 1.0,
+    "issues": (),
+    "suggested_domain": "employee"
+})
+
+_NON_DOMAIN_ANALYSIS = MappingProxyType({
+    "is_clear": True,
+    "query_type": "non_domain",
+    "domain_relevance": "none",
+    "complexity_level": "simple",
+    "confidence": 1.0,
+    "issues": ("Outside system scope",),
+    "suggested_domain": "none"
+})
+
+_TECHNICAL_ANALYSIS = MappingProxyType({
+    "is_clear": True,
+    "query_type": "technical",
+    "domain_relevance": "none",
+    "complexity_level": "simple",
+    "confidence": 0.9,
+    "issues": (),
+    "suggested_domain": "none"
+})
+
+# Keyword-routed analyses for queries that mention exactly one domain
+_KEYWORD_DOMAIN_ANALYSES = {
+    domain: MappingProxyType({
+        "is_clear": True,
+        "query_type": "clear",
+        "domain_relevance": domain,
+        "complexity_level": "simple",
+        "confidence": 0.85,
+        "issues": (),
+        "suggested_domain": domain
+    })
+    for domain in ("employee", "movies")
+}
+
+# Direct SQL: a statement keyword up front plus unmistakable SQL syntax, so English such as
+# "Update me on new movies" or "With the highest ratings, ..." is not taken for SQL
+_SQL_START_RE = re.compile(r"\s*(?:select|insert|update|delete|with)\b", re.IGNORECASE)
+_SQL_SYNTAX_RE = re.compile(
+    r";|\bSELECT\s+(?:DISTINCT\s+)?\*|\bFROM\s+\w+\.\w+|\bJOIN\b|\bGROUP\s+BY\b|\bORDER\s+BY\b|"
+    r"\bLIMIT\s+\d|\bWHERE\s+[\w.]+\s*(?:[<>!]?=|<>|[<>]|IN\b|LIKE\b|IS\b|BETWEEN\b)|"
+    r"\bSET\s+\w+\s*=|\bINTO\s+\w|\bVALUES\s*\(|\bAS\s*\(",
+    re.IGNORECASE
+)
+
+# Queries with fewer words than this are too short to route on keywords alone
+_KEYWORD_MIN_WORDS = 3
+
+# Attempts per LLM call when the provider returns a transient error (429/5xx/timeout)
+_LLM_MAX_ATTEMPTS = 4
+
+# Seconds a SQL agent diagnosis is reused before the checks are re-run
+_DIAGNOSIS_TTL = 60
+
+# Prompts at least this long are padded with filler up to PROMPT_CACHE_MIN_TOKENS: cached input
+# is billed at half price, so from here a warm padded prefix costs no more than the unpadded
+# prompt (shorter prompts would cost more padded, and are left as they are)
+_CACHE_PAD_FROM_TOKENS = PROMPT_CACHE_MIN_TOKENS // 2
+_CACHE_PADDING_LINE = "# --- CACHE PREFIX PADDING ---\n"
+
+# Minimum cosine similarity to a sample query to treat a query as clear. text-embedding-3-small
+# scores run lower and flatter than MiniLM (loosely related short queries already reach ~0.7),
+# so only near-paraphrases of a sample are routed without the LLM
+_SAMPLE_MATCH_THRESHOLD = 0.85
+
+# Seconds to wait before retrying a failed sample-embedding build
+_SAMPLE_RETRY_SECONDS = 30
+
+# Rough input budget (in tokens, ~4 chars each) for one batched ambiguous-query call
+_BATCH_TOKEN_BUDGET = 6000
+_BATCH_MAX_WORKERS = 8
+
+_DEFAULT_SUGGESTIONS: Tuple[str, ...] = (
+    "Show all employees in the company",
+    "Find action movies with high ratings",
+    "Display all departments and their budgets",
+    "Show movies from 2020"
+)
+
+@dataclass(slots=True, frozen=True)
+class HandlerResult:
+    """Result returned by the DataEngineerAgent handle_* methods"""
+    success: bool
+    query_type: str
+    original_query: str
+    response: Optional[str] = None
+    error: Optional[str] = None
+    execution_result: Optional[Dict[str, Any]] = None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to a plain dict for graph state / JSON serialization"""
+        return asdict(self)
+
+class QueryAnalysis(BaseModel):
+    """Structured output schema for analyze_query"""
+    is_clear: bool = Field(description="True if the query is clear and actionable")
+    query_type: Literal["clear", "ambiguous", "non_domain", "technical"]
+    domain_relevance: Literal["employee", "movies", "hybrid", "none"]
+    complexity_level: Literal["simple", "medium", "complex"]
+    confidence: float = Field(description="Confidence from 0.0 to 1.0")
+    issues: List[str] = Field(description="Specific issues found in the query")
+    suggested_domain: Literal["employee", "movies", "hybrid", "none"]
+
+class Clarifications(BaseModel):
+    """Structured output schema for provide_clarification_suggestions"""
+    suggestions: List[str] = Field(description="3-5 complete, actionable queries")
+
+# Model used for each free-text handler; None means a templated response with no LLM call
+_MODEL_ROUTES: Dict[str, Optional[str]] = {
+    "non_domain": None,
+    "technical": "gpt-4o-mini",
+    "ambiguous": "gpt-4o-mini",
+    "sql_guidance": "gpt-4o-mini"
+}
+
+_NON_DOMAIN_RESPONSE = """I understand you're asking about "{query}", which is outside what this system covers. It's designed for two databases:
+
+- Employee data (PostgreSQL): employees, departments, salaries and job titles
+- Movie data (MongoDB sample_mflix): movies, comments, users, sessions and theaters
+
+Here are some examples of what I can help you with:
+{examples}
+
+Would you like to explore any of these areas instead?"""
+
+def _module_available(name: str) -> bool:
+    """Check whether a module is importable without importing it"""
+    if name in sys.modules:
+        return True
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+@lru_cache(maxsize=None)
+def _get_model(model_name: str = "gpt-4o-mini") -> ChatOpenAI:
+    """Get the chat model shared by all DataEngineerAgent instances (one HTTP connection pool per model)"""
+    # Deterministic sampling so identical prompts give cacheable, repeatable answers
+    return ChatOpenAI(
+        model=model_name,
+        temperature=0,
+        seed=42,
+        # Transient errors are retried by the agent with jittered backoff instead
+        max_retries=0,
+        api_key=OPENAI_KEY
+    )
 
 class DataEngineerAgent:
     """Professional Data Engineer Agent for handling complex and unclear queries"""
     
     def __init__(self):
         """Initialize the Data Engineer Agent"""
-        self.model = ChatOpenAI(
-            model="gpt-4o-mini",
-            api_key=os.getenv("OPENAPI_KEY") or os.getenv("OPENAI_API_KEY")
-        )
+        self.model = _get_model()
+        self._models = {name: _get_model(name) for name in set(_MODEL_ROUTES.values()) if name}
+        # JSON mode for the batched ambiguous-query call
+        self._json_model = self.model.bind(response_format={"type": "json_object"})
+        
+        # Schema-constrained outputs, so analysis/suggestions never need a parse fallback
+        self._analyzer = self.model.with_structured_output(QueryAnalysis, method="json_schema", strict=True)
+        self._clarifier = self.model.with_structured_output(Clarifications, method="json_schema", strict=True)
         
         # Database context for professional responses
         self.database_context = {
@@ -55,6 +235,183 @@ class DataEngineerAgent:
                 ]
             }
         }
+        
+        # Serialize the context once so prompt prefixes stay byte-identical across calls
+        self._ctx_json = json_utils.dumps(self.database_context, indent=True, sort_keys=True)
+        
+        # Compact one-line-per-database schema summary for the prompts
+        self._compact_context = self._build_compact_context()
+        
+        # Lexical pre-filters for queries that don't need an LLM to analyze
+        self._non_domain_patterns = re.compile(
+            r"\b(weather|forecast|recipes?|cook|cooking|sports?|songs?|lyrics|jokes?)\b",
+            re.IGNORECASE
+        )
+        self._technical_patterns = re.compile(
+            r"\b(schema|schemas|database structure|table structure|data model|what tables|which tables|"
+            r"what collections|which collections)\b",
+            re.IGNORECASE
+        )
+        self._employee_patterns = re.compile(
+            r"\b(employees?|departments?|salary|salaries|managers?|hired|hire date)\b",
+            re.IGNORECASE
+        )
+        self._movie_patterns = re.compile(
+            r"\b(movies?|films?|comments?|directors?|ratings?|theaters?|genres?|imdb|actors?|cast)\b",
+            re.IGNORECASE
+        )
+        
+        # Embedding index over the sample queries, built lazily on first use
+        self._sample_embs: Optional[List[List[float]]] = None
+        self._sample_domains: List[str] = []
+        self._sample_retry_at = 0.0
+        
+        # Canned non-domain reply: the examples are the sample queries from both databases
+        self._non_domain_examples = "\n".join(
+            f"- {sample}"
+            for db in self.database_context.values()
+            for sample in db["sample_queries"]
+        )
+        
+        # Exact + semantic cache for LLM responses, shared by all handlers
+        self._response_cache = ResponseCache(maxsize=512, ttl=3600, similarity=0.92)
+        
+        # check_executor flag -> (timestamp, report) of the last SQL agent diagnosis
+        self._diag_cache: Dict[bool, Tuple[float, str]] = {}
+        
+        # Bounded-concurrency client for fanning out several prompts at once
+        self._batch_client = BatchLLMClient(self.model, max_workers=_BATCH_MAX_WORKERS)
+        
+        # Prompts are fully static given the context, so build each one once, sized so
+        # OpenAI's automatic prefix caching applies
+        self._analysis_prompt_str = self._fit_cache_prefix("analysis", self._build_analysis_prompt())
+        self._clarification_prompt_str = self._fit_cache_prefix("clarification", self._build_clarification_prompt())
+        self._technical_prompt_str = self._fit_cache_prefix("technical", self._build_technical_prompt())
+        self._non_domain_prompt_str = self._fit_cache_prefix("non_domain", self._build_non_domain_prompt())
+        self._ambiguous_prompt_str = self._fit_cache_prefix("ambiguous", self._build_ambiguous_prompt())
+        self._ambiguous_batch_prompt_str = self._fit_cache_prefix("ambiguous_batch", self._build_ambiguous_batch_prompt())
+        self._sql_guidance_prompt_str = self._fit_cache_prefix("sql_guidance", self._build_sql_guidance_prompt())
+        
+        # Chat prompt templates built once; the system prompt is a literal message (it
+        # contains JSON braces) and handlers only fill in the human turn
+        self._analysis_template = self._build_template(self._get_analysis_prompt(), "Analyze this query: {query}")
+        self._clarification_template = self._build_template(self._get_clarification_prompt(), "Query: {query}\nAnalysis: {analysis}")
+        self._technical_template = self._build_template(self._get_technical_prompt(), "Technical query: {query}")
+        self._non_domain_template = self._build_template(self._get_non_domain_prompt(), "Non-domain query: {query}")
+        self._ambiguous_template = self._build_template(self._get_ambiguous_prompt(), "Ambiguous query: {query}\nAnalysis: {analysis}")
+        self._ambiguous_batch_template = self._build_template(self._get_ambiguous_batch_prompt(), "{items}")
+        self._sql_guidance_template = self._build_template(self._get_sql_guidance_prompt(), "SQL-related query: {query}\n\nDiagnosis: {diagnosis}")
+        
+        # Persist exact-match responses across restarts (responses are deterministic at temperature 0)
+        self._response_cache.store = self._open_response_store()
+    
+    def _open_response_store(self) -> Optional[PersistentResponseStore]:
+        """
+        Open the on-disk response store, namespaced by model and prompt text
+        
+        Returns:
+            The store, or None if persistence is disabled or the file can't be opened
+        """
+        namespace = hash_text(
+            *sorted(self._models),
+            self._analysis_prompt_str,
+            self._clarification_prompt_str,
+            self._technical_prompt_str,
+            self._non_domain_prompt_str,
+            self._ambiguous_prompt_str,
+            self._sql_guidance_prompt_str
+        )
+        return open_response_store(LLM_CACHE_PATH, namespace)
+    
+    @staticmethod
+    def _build_template(system_prompt: str, human_template: str) -> ChatPromptTemplate:
+        """Build a chat prompt with a fixed system message and a formatted human message"""
+        return ChatPromptTemplate.from_messages([SystemMessage(content=system_prompt), ("human", human_template)])
+    
+    def _invoke_cached(self, method_tag: str, query: str, template: ChatPromptTemplate, variables: Dict[str, str],
+                       model: Any = None, parse: Any = None, context: str = "") -> Any:
+        """
+        Invoke the LLM through the response cache
+        
+        Args:
+            method_tag: Name of the calling method (cache namespace)
+            query: User query used as the cache key
+            template: Prompt template formatted on a cache miss
+            variables: Template variables
+            model: Model/binding to invoke (defaults to self.model)
+            parse: Optional callable applied to the raw response before caching
+                (defaults to taking response.content)
+            context: Extra text the response depends on besides the query
+            
+        Returns:
+            Cached or freshly generated (and parsed) response content
+        """
+        cached = self._response_cache.get(method_tag, query, context=context)
+        if cached is not None:
+            return cached
+        
+        # A per-handler prompt_cache_key keeps requests that share a system-prompt
+        # prefix on the same OpenAI cache shard
+        messages = template.format_messages(**variables)
+        response = invoke_with_retry(model or self.model, messages, max_attempts=_LLM_MAX_ATTEMPTS,
+                                     prompt_cache_key=f"locoforge-data-engineer-{method_tag}")
+        value = parse(response) if parse else response.content
+        self._response_cache.set(method_tag, query, value, context=context)
+        return value
+    
+    @staticmethod
+    def _serialize_analysis(analysis: Dict[str, Any]) -> Tuple[str, str]:
+        """
+        Serialize an analysis for a prompt
+        
+        Returns:
+            Tuple of (analysis JSON, cache context), since the response depends on the analysis
+        """
+        analysis_json = json_utils.dumps(analysis, sort_keys=True)
+        return analysis_json, hash_text(analysis_json)
+    
+    def _build_compact_context(self) -> str:
+        """Build a token-efficient summary of database_context for the system prompts"""
+        sql_db = self.database_context["sql_database"]
+        nosql_db = self.database_context["nosql_database"]
+        schema = sql_db["tables"][0].split(".")[0]
+        tables = ",".join(table.split(".", 1)[-1] for table in sql_db["tables"])
+        collections = ",".join(nosql_db["collections"])
+        samples = "; ".join(sql_db["sample_queries"] + nosql_db["sample_queries"])
+        return (
+            f"SQL[{schema}]: {tables} | NoSQL[sample_mflix]: {collections}\n"
+            f"Sample queries: {samples}"
+        )
+    
+    def _fit_cache_prefix(self, name: str, prompt: str) -> str:
+        """
+        Pad a system prompt to the provider prompt-cache threshold when that is worthwhile
+        
+        Args:
+            name: Prompt name for logging
+            prompt: Built system prompt
+            
+        Returns:
+            The prompt, padded with filler lines to PROMPT_CACHE_MIN_TOKENS if it was at
+            least _CACHE_PAD_FROM_TOKENS long
+        """
+        tokens = count_tokens(prompt)
+        if _CACHE_PAD_FROM_TOKENS <= tokens < PROMPT_CACHE_MIN_TOKENS:
+            padding_tokens = count_tokens(_CACHE_PADDING_LINE)
+            while tokens < PROMPT_CACHE_MIN_TOKENS:
+                prompt += _CACHE_PADDING_LINE
+                tokens += padding_tokens
+        logger.info(f"Data Engineer {name} prompt: {tokens} tokens")
+        return prompt
+    
+    def _route_model(self, query_type: str) -> Optional[ChatOpenAI]:
+        """Get the model configured for a handler's query type, or None if it is templated"""
+        model_name = _MODEL_ROUTES.get(query_type, "gpt-4o-mini")
+        return self._models[model_name] if model_name else None
+    
+    def _templated_non_domain_response(self, query: str) -> str:
+        """Build the canned response for an out-of-scope query"""
+        return _NON_DOMAIN_RESPONSE.format(query=query.strip(), examples=self._non_domain_examples)
     
     def analyze_query(self, query: str) -> Dict[str, Any]:
         """
@@ -66,21 +423,120 @@ class DataEngineerAgent:
         Returns:
             Dictionary with analysis results and recommendations
         """
-        system_prompt = self._get_analysis_prompt()
+        # Short-circuit obvious cases without an LLM round-trip
+        if self._is_direct_sql(query):
+            return dict(_DIRECT_SQL_ANALYSIS)
+        # Out-of-scope words only decide when no domain word is present: mflix has Sport
+        # and Music genres, so "sports movies" or "movies with songs" are movie queries
+        if (self._non_domain_patterns.search(query)
+                and not self._employee_patterns.search(query)
+                and not self._movie_patterns.search(query)):
+            return dict(_NON_DOMAIN_ANALYSIS)
+        keyword_match = self._match_keywords(query)
+        if keyword_match:
+            return keyword_match
         
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=f"Analyze this query: {query}")
-        ]
+        # Route queries that closely match a known sample query without the LLM. Queries
+        # naming both domains are likely hybrid, which no single-domain sample represents
+        if not (self._employee_patterns.search(query) and self._movie_patterns.search(query)):
+            sample_match = self._match_sample_query(query)
+            if sample_match:
+                return sample_match
         
         try:
-            response = self.model.invoke(messages)
-            analysis = json.loads(response.content)
-            return analysis
+            analysis = self._invoke_cached("analyze_query", query, self._analysis_template, {"query": query},
+                                           model=self._analyzer,
+                                           parse=QueryAnalysis.model_dump)
+            return dict(analysis)
+        except (ValidationError, ValueError) as e:
+            # Malformed model output: retrying the same prompt won't help
+            logger.warning(f"Unparseable query analysis: {e}")
+            return self._get_default_analysis(query)
         except Exception as e:
             logger.error(f"Error analyzing query: {e}")
             return self._get_default_analysis(query)
     
+    @staticmethod
+    def _is_direct_sql(query: str) -> bool:
+        """Check whether a query is a SQL statement rather than English that starts with a SQL keyword"""
+        return _SQL_START_RE.match(query) is not None and _SQL_SYNTAX_RE.search(query) is not None
+    
+    def _match_keywords(self, query: str) -> Optional[Dict[str, Any]]:
+        """
+        Classify a query from domain keywords alone
+        
+        Args:
+            query: User query string
+            
+        Returns:
+            Analysis for a technical or single-domain query, or None if the LLM should decide
+        """
+        if len(query.split()) < _KEYWORD_MIN_WORDS:
+            return None
+        if self._technical_patterns.search(query):
+            return dict(_TECHNICAL_ANALYSIS)
+        
+        # Queries touching both domains (or neither) are left to the LLM
+        employee = bool(self._employee_patterns.search(query))
+        movies = bool(self._movie_patterns.search(query))
+        if employee == movies:
+            return None
+        return dict(_KEYWORD_DOMAIN_ANALYSES["employee" if employee else "movies"])
+    
+    def _match_sample_query(self, query: str) -> Optional[Dict[str, Any]]:
+        """
+        Match a query against the embedded sample queries
+        
+        Args:
+            query: User query string
+            
+        Returns:
+            Analysis for the nearest sample's domain, or None if nothing is close enough
+        """
+        if self._sample_embs is None:
+            # After a failed build, skip sample matching briefly instead of retrying every call
+            if time.monotonic() < self._sample_retry_at:
+                return None
+            samples = []
+            domains = []
+            for db_key, domain in (("sql_database", "employee"), ("nosql_database", "movies")):
+                for sample in self.database_context[db_key]["sample_queries"]:
+                    samples.append(sample)
+                    domains.append(domain)
+            try:
+                sample_embs = embed_texts(samples)
+            except Exception as e:
+                logger.warning(f"Sample query matching unavailable, retrying in {_SAMPLE_RETRY_SECONDS}s: {e}")
+                self._sample_retry_at = time.monotonic() + _SAMPLE_RETRY_SECONDS
+                return None
+            self._sample_domains = domains
+            self._sample_embs = sample_embs
+        
+        if not self._sample_embs:
+            return None
+        
+        try:
+            # Embed the normalized query: the response cache embeds the same text, so an
+            # LLM fallback reuses this embedding instead of making another request
+            index, similarity = best_match(embed_text(normalize_query(query)), self._sample_embs)
+        except Exception as e:
+            logger.warning(f"Sample query matching skipped: {e}")
+            return None
+        
+        if similarity < _SAMPLE_MATCH_THRESHOLD:
+            return None
+        
+        domain = self._sample_domains[index]
+        return {
+            "is_clear": True,
+            "query_type": "clear",
+            "domain_relevance": domain,
+            "complexity_level": "simple",
+            "confidence": round(similarity, 3),
+            "issues": [],
+            "suggested_domain": domain
+        }
+    
     def provide_clarification_suggestions(self, query: str, analysis: Dict[str, Any]) -> List[str]:
         """
         Generate clarification suggestions for unclear queries
@@ -95,22 +551,20 @@ class DataEngineerAgent:
         if analysis.get("is_clear", True):
             return []
         
-        system_prompt = self._get_clarification_prompt()
-        
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=f"Query: {query}\nAnalysis: {json.dumps(analysis)}")
-        ]
-        
         try:
-            response = self.model.invoke(messages)
-            suggestions = json.loads(response.content)
-            return suggestions.get("suggestions", [])
+            analysis_json, context = self._serialize_analysis(analysis)
+            suggestions = self._invoke_cached("provide_clarification_suggestions", query, self._clarification_template,
+                                              {"query": query, "analysis": analysis_json}, context=context,
+                                              model=self._clarifier, parse=Clarifications.model_dump)
+            return list(suggestions["suggestions"])
+        except (ValidationError, ValueError) as e:
+            logger.warning(f"Unparseable clarification suggestions: {e}")
+            return self._get_default_suggestions(query)
         except Exception as e:
             logger.error(f"Error generating suggestions: {e}")
             return self._get_default_suggestions(query)
     
-    def handle_technical_query(self, query: str) -> Dict[str, Any]:
+    def handle_technical_query(self, query: str) -> HandlerResult:
         """
         Handle technical queries like schema requests, database structure questions
         
@@ -120,31 +574,25 @@ class DataEngineerAgent:
         Returns:
             Professional response with technical details
         """
-        system_prompt = self._get_technical_prompt()
-        
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=f"Technical query: {query}")
-        ]
-        
         try:
-            response = self.model.invoke(messages)
-            return {
-                "success": True,
-                "response": response.content,
-                "query_type": "technical",
-                "original_query": query
-            }
+            content = self._invoke_cached("handle_technical_query", query, self._technical_template, {"query": query},
+                                          model=self._route_model("technical"))
+            return HandlerResult(
+                success=True,
+                response=content,
+                query_type="technical",
+                original_query=query
+            )
         except Exception as e:
             logger.error(f"Error handling technical query: {e}")
-            return {
-                "success": False,
-                "error": str(e),
-                "query_type": "technical",
-                "original_query": query
-            }
+            return HandlerResult(
+                success=False,
+                error=str(e),
+                query_type="technical",
+                original_query=query
+            )
     
-    def handle_non_domain_query(self, query: str) -> Dict[str, Any]:
+    def handle_non_domain_query(self, query: str) -> HandlerResult:
         """
         Handle queries that are outside the system's domain
         
@@ -154,31 +602,29 @@ class DataEngineerAgent:
         Returns:
             Professional response explaining system capabilities
         """
-        system_prompt = self._get_non_domain_prompt()
-        
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=f"Non-domain query: {query}")
-        ]
-        
         try:
-            response = self.model.invoke(messages)
-            return {
-                "success": True,
-                "response": response.content,
-                "query_type": "non_domain",
-                "original_query": query
-            }
+            model = self._route_model("non_domain")
+            if model is None:
+                content = self._templated_non_domain_response(query)
+            else:
+                content = self._invoke_cached("handle_non_domain_query", query, self._non_domain_template, {"query": query},
+                                              model=model)
+            return HandlerResult(
+                success=True,
+                response=content,
+                query_type="non_domain",
+                original_query=query
+            )
         except Exception as e:
             logger.error(f"Error handling non-domain query: {e}")
-            return {
-                "success": False,
-                "error": str(e),
-                "query_type": "non_domain",
-                "original_query": query
-            }
+            return HandlerResult(
+                success=False,
+                error=str(e),
+                query_type="non_domain",
+                original_query=query
+            )
     
-    def handle_ambiguous_query(self, query: str, analysis: Dict[str, Any]) -> Dict[str, Any]:
+    def handle_ambiguous_query(self, query: str, analysis: Dict[str, Any]) -> HandlerResult:
         """
         Handle ambiguous queries by providing database context and guidance
         
@@ -189,31 +635,98 @@ class DataEngineerAgent:
         Returns:
             Professional response with database context and guidance
         """
-        system_prompt = self._get_ambiguous_prompt()
-        
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=f"Ambiguous query: {query}\nAnalysis: {json.dumps(analysis)}")
-        ]
-        
         try:
-            response = self.model.invoke(messages)
-            return {
-                "success": True,
-                "response": response.content,
-                "query_type": "ambiguous",
-                "original_query": query
-            }
+            analysis_json, context = self._serialize_analysis(analysis)
+            content = self._invoke_cached("handle_ambiguous_query", query, self._ambiguous_template,
+                                          {"query": query, "analysis": analysis_json}, context=context,
+                                          model=self._route_model("ambiguous"))
+            return HandlerResult(
+                success=True,
+                response=content,
+                query_type="ambiguous",
+                original_query=query
+            )
         except Exception as e:
             logger.error(f"Error handling ambiguous query: {e}")
-            return {
-                "success": False,
-                "error": str(e),
-                "query_type": "ambiguous",
-                "original_query": query
-            }
+            return HandlerResult(
+                success=False,
+                error=str(e),
+                query_type="ambiguous",
+                original_query=query
+            )
+    
+    def handle_ambiguous_batch(self, queries_and_analyses: List[Tuple[str, Dict[str, Any]]]) -> List[HandlerResult]:
+        """
+        Handle several ambiguous queries with a single LLM call
+        
+        Args:
+            queries_and_analyses: List of (query, analysis) pairs
+            
+        Returns:
+            List of HandlerResult objects in the same order as the input
+        """
+        results: List[Optional[HandlerResult]] = [None] * len(queries_and_analyses)
+        serialized = [self._serialize_analysis(analysis) for _, analysis in queries_and_analyses]
+        
+        # Serve previously answered (query, analysis) pairs from the cache
+        for index, (query, _) in enumerate(queries_and_analyses):
+            cached = self._response_cache.get("handle_ambiguous_query", query, context=serialized[index][1])
+            if cached is not None:
+                results[index] = HandlerResult(success=True, response=cached, query_type="ambiguous", original_query=query)
+        
+        # Pack as many of the remaining queries as fit in the token budget into one prompt
+        batch_items = []
+        used_tokens = 0
+        for index, (query, _) in enumerate(queries_and_analyses):
+            if results[index] is not None:
+                continue
+            item = f"{index}. Ambiguous query: {query}\n   Analysis: {serialized[index][0]}"
+            item_tokens = len(item) // 4 + 1
+            if used_tokens + item_tokens > _BATCH_TOKEN_BUDGET:
+                break
+            batch_items.append(item)
+            used_tokens += item_tokens
+        
+        if batch_items:
+            messages = self._ambiguous_batch_template.format_messages(items="\n".join(batch_items))
+            try:
+                response = invoke_with_retry(self._json_model, messages, max_attempts=_LLM_MAX_ATTEMPTS,
+                                             prompt_cache_key="locoforge-data-engineer-ambiguous-batch")
+                for item in json_utils.loads(response.content).get("results", []):
+                    index = item.get("index")
+                    if isinstance(index, int) and 0 <= index < len(results) and results[index] is None and item.get("response"):
+                        self._response_cache.set("handle_ambiguous_query", queries_and_analyses[index][0], item["response"],
+                                                 context=serialized[index][1])
+                        results[index] = HandlerResult(
+                            success=True,
+                            response=item["response"],
+                            query_type="ambiguous",
+                            original_query=queries_and_analyses[index][0]
+                        )
+            except Exception as e:
+                logger.error(f"Error handling ambiguous query batch: {e}")
+        
+        # Queries over the budget (or missing from the batch response) fall back to
+        # individual calls submitted concurrently through the batch client
+        pending = [index for index, result in enumerate(results) if result is None]
+        if pending:
+            requests = []
+            for index in pending:
+                query = queries_and_analyses[index][0]
+                requests.append(("handle_ambiguous_query", self._ambiguous_template.format_messages(
+                    query=query, analysis=serialized[index][0]
+                )))
+            for index, content in zip(pending, self._batch_client.batch(requests)):
+                query = queries_and_analyses[index][0]
+                if isinstance(content, Exception):
+                    results[index] = HandlerResult(success=False, error=str(content), query_type="ambiguous", original_query=query)
+                else:
+                    self._response_cache.set("handle_ambiguous_query", query, content, context=serialized[index][1])
+                    results[index] = HandlerResult(success=True, response=content, query_type="ambiguous", original_query=query)
+        
+        return results
     
-    def handle_sql_query_without_agent(self, query: str) -> Dict[str, Any]:
+    def handle_sql_query_without_agent(self, query: str) -> HandlerResult:
         """
         Handle SQL-related queries when SQL agent is not available
         
@@ -226,105 +739,213 @@ class DataEngineerAgent:
         # First, diagnose the actual issue
         diagnosis = self._diagnose_sql_agent_issue()
         
-        system_prompt = self._get_sql_guidance_prompt()
-        
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=f"SQL-related query: {query}\n\nDiagnosis: {diagnosis}")
-        ]
-        
         try:
-            response = self.model.invoke(messages)
-            return {
-                "success": True,
-                "response": response.content,
-                "query_type": "sql_guidance",
-                "original_query": query,
-                "execution_result": {
+            content = self._invoke_cached("handle_sql_query_without_agent", query, self._sql_guidance_template,
+                                          {"query": query, "diagnosis": diagnosis}, context=diagnosis,
+                                          model=self._route_model("sql_guidance"))
+            return HandlerResult(
+                success=True,
+                response=content,
+                query_type="sql_guidance",
+                original_query=query,
+                execution_result={
                     "success": False,
                     "error": diagnosis,
                     "row_count": 0,
                     "data": []
                 }
-            }
+            )
         except Exception as e:
             logger.error(f"Error handling SQL query without agent: {e}")
-            return {
-                "success": False,
-                "error": str(e),
-                "query_type": "sql_guidance",
-                "original_query": query,
-                "execution_result": {
+            return HandlerResult(
+                success=False,
+                error=str(e),
+                query_type="sql_guidance",
+                original_query=query,
+                execution_result={
                     "success": False,
                     "error": str(e),
                     "row_count": 0,
                     "data": []
                 }
-            }
+            )
     
-    def _diagnose_sql_agent_issue(self) -> str:
+    # Async variants: the handlers are blocking network calls, so run them in worker
+    # threads and let callers fan out independent calls with asyncio.gather(...)
+    
+    async def aanalyze_query(self, query: str) -> Dict[str, Any]:
+        """Async variant of analyze_query"""
+        return await asyncio.to_thread(self.analyze_query, query)
+    
+    async def aprovide_clarification_suggestions(self, query: str, analysis: Dict[str, Any]) -> List[str]:
+        """Async variant of provide_clarification_suggestions"""
+        return await asyncio.to_thread(self.provide_clarification_suggestions, query, analysis)
+    
+    async def ahandle_technical_query(self, query: str) -> HandlerResult:
+        """Async variant of handle_technical_query"""
+        return await asyncio.to_thread(self.handle_technical_query, query)
+    
+    async def ahandle_non_domain_query(self, query: str) -> HandlerResult:
+        """Async variant of handle_non_domain_query"""
+        return await asyncio.to_thread(self.handle_non_domain_query, query)
+    
+    async def ahandle_ambiguous_query(self, query: str, analysis: Dict[str, Any]) -> HandlerResult:
+        """Async variant of handle_ambiguous_query"""
+        return await asyncio.to_thread(self.handle_ambiguous_query, query, analysis)
+    
+    async def ahandle_sql_query_without_agent(self, query: str) -> HandlerResult:
+        """Async variant of handle_sql_query_without_agent"""
+        return await asyncio.to_thread(self.handle_sql_query_without_agent, query)
+    
+    def _diagnose_sql_agent_issue(self, check_executor: bool = False) -> str:
         """
-        Diagnose why the SQL agent is not working
+        Diagnose why the SQL agent is not working, reusing a recent diagnosis
+        
+        Args:
+            check_executor: Also try to construct a SQLQueryExecutor (may open a
+                database connection), e.g. for explicit status checks
         
         Returns:
             String describing the root cause
         """
-        issues = []
+        cached = self._diag_cache.get(check_executor)
+        if cached is not None and time.monotonic() - cached[0] < _DIAGNOSIS_TTL:
+            return cached[1]
         
-        # Check if psycopg2 is available
-        try:
-            import psycopg2
-            issues.append("✅ psycopg2 is available")
-        except ImportError:
-            issues.append("❌ psycopg2 is not available - install with: pip install psycopg2-binary")
+        diagnosis = self._run_sql_agent_diagnosis(check_executor)
+        self._diag_cache[check_executor] = (time.monotonic(), diagnosis)
+        return diagnosis
+    
+    def _run_sql_agent_diagnosis(self, check_executor: bool = False) -> str:
+        """
+        Run the dependency, environment and (optionally) initialization checks for the SQL agent
         
-        # Check if SQL agent can be imported
-        try:
-            from my_agent.utils.sql_agent import SQLQueryExecutor
-            issues.append("✅ SQL agent module can be imported")
-        except ImportError as e:
-            issues.append(f"❌ SQL agent module import failed: {e}")
+        Args:
+            check_executor: Also try to construct a SQLQueryExecutor
         
-        # Check environment variables
-        import os
-        openai_key = os.getenv("OPENAPI_KEY") or os.getenv("OPENAI_API_KEY")
-        postgres_url = os.getenv("POSTGRES_DB_URL")
+        Returns:
+            String describing the root cause
+        """
+        return run_sync(self._adiagnose(check_executor))
+    
+    async def _adiagnose(self, check_executor: bool = False) -> str:
+        """
+        Run the SQL agent checks concurrently, so the report takes as long as the slowest check
+        
+        Args:
+            check_executor: Also try to construct a SQLQueryExecutor
+        
+        Returns:
+            String describing the root cause
+        """
+        checks = [
+            self._check_psycopg2,
+            self._check_sql_agent_import,
+            self._check_langgraph,
+        ]
+        # Executor construction (possibly a DB connect) only makes sense with credentials set
+        if check_executor and OPENAI_KEY and POSTGRES_DB_URL:
+            checks.append(self._check_sql_executor)
+        results = await asyncio.gather(*(asyncio.to_thread(check) for check in checks), return_exceptions=True)
+        lines = [
+            f"❌ {check.__name__.lstrip('_')} failed: {result}" if isinstance(result, Exception) else result
+            for check, result in zip(checks, results)
+        ]
+        psycopg2_line, sql_agent_line, langgraph_line = lines[:3]
+        executor_line = lines[3] if len(lines) > 3 else None
+        
+        issues = [psycopg2_line, sql_agent_line]
         
-        if openai_key:
+        # Check environment variables
+        if OPENAI_KEY:
             issues.append("✅ OpenAI API key is set")
         else:
             issues.append("❌ OpenAI API key is not set (OPENAPI_KEY or OPENAI_API_KEY)")
         
-        if postgres_url:
+        if POSTGRES_DB_URL:
             issues.append("✅ PostgreSQL URL is set")
         else:
             issues.append("❌ PostgreSQL URL is not set (POSTGRES_DB_URL)")
         
-        # Try to initialize SQL agent to see what fails
-        if all(["✅" in issue for issue in issues[:4]]):  # If all basic checks pass
-            try:
-                agent = SQLQueryExecutor()
-                issues.append("✅ SQL agent initialized successfully")
+        # Report the SQL agent initialization only if all basic checks pass
+        if executor_line and all(["✅" in issue for issue in issues[:4]]):
+            if "✅" in executor_line:
                 return "SQL agent should be working - this might be a LangGraph Studio environment issue"
-            except Exception as e:
-                issues.append(f"❌ SQL agent initialization failed: {e}")
+            issues.append(executor_line)
         
         # Check if we're in LangGraph Studio context
-        try:
-            import langgraph
-            issues.append("✅ LangGraph is available")
-        except ImportError:
-            issues.append("❌ LangGraph is not available")
+        issues.append(langgraph_line)
         
         return "\n".join(issues)
     
+    @staticmethod
+    def _check_psycopg2() -> str:
+        """Check if psycopg2 is available"""
+        if _module_available("psycopg2"):
+            return "✅ psycopg2 is available"
+        return "❌ psycopg2 is not available - install with: pip install psycopg2-binary"
+    
+    @staticmethod
+    def _check_sql_agent_import() -> str:
+        """Check if the SQL agent module and its asyncpg driver are present"""
+        if not _module_available("my_agent.utils.sql_agent"):
+            return "❌ SQL agent module import failed: my_agent.utils.sql_agent not found"
+        if not _module_available("asyncpg"):
+            return "❌ SQL agent module import failed: No module named 'asyncpg'"
+        return "✅ SQL agent module can be imported"
+    
+    @staticmethod
+    def _check_langgraph() -> str:
+        """Check if LangGraph is available"""
+        if _module_available("langgraph"):
+            return "✅ LangGraph is available"
+        return "❌ LangGraph is not available"
+    
+    @staticmethod
+    def _check_sql_executor() -> str:
+        """Try to initialize the SQL agent to see what fails"""
+        try:
+            from my_agent.utils.sql_agent import SQLQueryExecutor
+            SQLQueryExecutor()
+            return "✅ SQL agent initialized successfully"
+        except Exception as e:
+            return f"❌ SQL agent initialization failed: {e}"
+    
     def _get_analysis_prompt(self) -> str:
-        """Get the system prompt for query analysis"""
+        """Get the prebuilt system prompt for analysis calls"""
+        return self._analysis_prompt_str
+    
+    def _get_clarification_prompt(self) -> str:
+        """Get the prebuilt system prompt for clarification calls"""
+        return self._clarification_prompt_str
+    
+    def _get_technical_prompt(self) -> str:
+        """Get the prebuilt system prompt for technical calls"""
+        return self._technical_prompt_str
+    
+    def _get_non_domain_prompt(self) -> str:
+        """Get the prebuilt system prompt for non-domain calls"""
+        return self._non_domain_prompt_str
+    
+    def _get_ambiguous_prompt(self) -> str:
+        """Get the prebuilt system prompt for ambiguous calls"""
+        return self._ambiguous_prompt_str
+    
+    def _get_ambiguous_batch_prompt(self) -> str:
+        """Get the prebuilt system prompt for ambiguous batch calls"""
+        return self._ambiguous_batch_prompt_str
+    
+    def _get_sql_guidance_prompt(self) -> str:
+        """Get the prebuilt system prompt for SQL guidance calls"""
+        return self._sql_guidance_prompt_str
+    
+    def _build_analysis_prompt(self) -> str:
+        """Build the system prompt for query analysis"""
         return f"""
 You are a professional Data Engineer analyzing queries for a hybrid database system.
 
 DATABASE CONTEXT:
-{json.dumps(self.database_context, indent=2)}
+{self._compact_context}
 
 ANALYSIS TASK:
 Analyze the query and return a JSON object with:
@@ -352,13 +973,13 @@ IMPORTANT RULES:
 Return ONLY the JSON object.
 """
     
-    def _get_clarification_prompt(self) -> str:
-        """Get the system prompt for generating clarification suggestions"""
+    def _build_clarification_prompt(self) -> str:
+        """Build the system prompt for generating clarification suggestions"""
         return f"""
 You are a professional Data Engineer helping users refine unclear queries.
 
 DATABASE CONTEXT:
-{json.dumps(self.database_context, indent=2)}
+{self._compact_context}
 
 TASK:
 Generate 3-5 specific clarification suggestions for the unclear query.
@@ -391,13 +1012,13 @@ For "What's the data?":
 Return ONLY the JSON object.
 """
     
-    def _get_technical_prompt(self) -> str:
-        """Get the system prompt for handling technical queries"""
+    def _build_technical_prompt(self) -> str:
+        """Build the system prompt for handling technical queries"""
         return f"""
 You are a professional Data Engineer providing technical guidance about database systems.
 
 DATABASE CONTEXT:
-{json.dumps(self.database_context, indent=2)}
+{self._ctx_json}
 
 TASK:
 Provide a professional, helpful response to technical queries about the database system.
@@ -419,13 +1040,13 @@ EXAMPLES:
 Be helpful, accurate, and professional.
 """
     
-    def _get_non_domain_prompt(self) -> str:
-        """Get the system prompt for handling non-domain queries"""
+    def _build_non_domain_prompt(self) -> str:
+        """Build the system prompt for handling non-domain queries"""
         return f"""
 You are a professional Data Engineer responding to queries outside your system's scope.
 
 DATABASE CONTEXT:
-{json.dumps(self.database_context, indent=2)}
+{self._compact_context}
 
 TASK:
 Politely explain that the query is outside the system's domain and provide:
@@ -453,13 +1074,13 @@ Would you like to explore any of these areas instead?"
 Be helpful and professional while clearly defining system boundaries.
 """
     
-    def _get_ambiguous_prompt(self) -> str:
-        """Get the system prompt for handling ambiguous queries"""
+    def _build_ambiguous_prompt(self) -> str:
+        """Build the system prompt for handling ambiguous queries"""
         return f"""
 You are a professional Data Engineer helping users with unclear database queries.
 
 DATABASE CONTEXT:
-{json.dumps(self.database_context, indent=2)}
+{self._compact_context}
 
 TASK:
 Provide a helpful, database-focused response to ambiguous queries. Instead of just saying "I can't process this", give users useful information about what data is available and how they can query it.
@@ -500,13 +1121,24 @@ What specific information would you like to see?"
 Be helpful, informative, and guide users toward specific, actionable queries.
 """
     
-    def _get_sql_guidance_prompt(self) -> str:
-        """Get the system prompt for handling SQL queries when SQL agent is not available"""
+    def _build_ambiguous_batch_prompt(self) -> str:
+        """Build the system prompt for handling a numbered batch of ambiguous queries"""
+        return self._ambiguous_prompt_str + """
+BATCH MODE:
+You will receive a numbered list of ambiguous queries, each with its analysis.
+Write one response per query following the guidelines above.
+
+Return ONLY a JSON object of the form:
+{"results": [{"index": 0, "response": "..."}, {"index": 1, "response": "..."}]}
+"""
+    
+    def _build_sql_guidance_prompt(self) -> str:
+        """Build the system prompt for handling SQL queries when SQL agent is not available"""
         return f"""
 You are a professional Data Engineer providing guidance for SQL queries when the SQL agent is temporarily unavailable.
 
 DATABASE CONTEXT:
-{json.dumps(self.database_context, indent=2)}
+{self._compact_context}
 
 SITUATION:
 The SQL agent is currently unavailable. I can provide you with detailed information about the database structure and help you understand what queries would work.
@@ -556,21 +1188,9 @@ Be helpful, informative, and maintain a professional tone while explaining the t
     
     def _get_default_analysis(self, query: str) -> Dict[str, Any]:
         """Get default analysis when LLM fails"""
-        return {
-            "is_clear": False,
-            "query_type": "ambiguous",
-            "domain_relevance": "none",
-            "complexity_level": "simple",
-            "confidence": 0.0,
-            "issues": ["Unable to analyze query"],
-            "suggested_domain": "none"
-        }
+        # Shallow copy so callers can still json.dumps() / annotate the result
+        return dict(_DEFAULT_ANALYSIS)
     
     def _get_default_suggestions(self, query: str) -> List[str]:
         """Get default suggestions when LLM fails"""
-        return [
-            "Show all employees in the company",
-            "Find action movies with high ratings",
-            "Display all departments and their budgets",
-            "Show movies from 2020"
-        ] 
\ No newline at end of file
+        return list(_DEFAULT_SUGGESTIONS) 
\ No newline at end of file
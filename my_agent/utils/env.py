@@ -0,0 +1,33 @@
+"""
+Environment Settings
+Loads the .env file once per process and reads the API keys and connection strings
+"""
+
+import os
+from dotenv import load_dotenv
+
+_DOTENV_LOADED_FLAG = "_DOTENV_LOADED"
+
+# Extra .env locations relative to the working directory (LangGraph Studio may start the
+# server from a subdirectory of the project); existing variables are never overridden
+_EXTRA_ENV_FILES = (".env", "../.env", "../../.env")
+
+def load_env() -> None:
+    """Load the .env file(s) unless this process (or a parent) has already done so"""
+    if not os.environ.get(_DOTENV_LOADED_FLAG):
+        load_dotenv()
+        for path in _EXTRA_ENV_FILES:
+            if os.path.exists(path):
+                load_dotenv(path)
+        os.environ[_DOTENV_LOADED_FLAG] = "1"
+
+load_env()
+
+# Read once at import; OPENAPI_KEY is the project's historical name for the OpenAI key
+OPENAI_KEY = os.getenv("OPENAPI_KEY") or os.getenv("OPENAI_API_KEY")
+GEMINI_KEY = os.getenv("GEMINI_KEY")
+POSTGRES_DB_URL = os.getenv("POSTGRES_DB_URL")
+MONGO_DB = os.getenv("MONGO_DB")
+
+# SQLite file for the persistent LLM response cache; set LLM_CACHE_PATH="" to disable
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.expanduser("~/.cache/locoforge/llm.db"))
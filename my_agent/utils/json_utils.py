@@ -0,0 +1,51 @@
+"""
+JSON Helpers
+Serialize and parse JSON with orjson when it is installed, falling back to the
+standard library with the same separators and indentation. Output is equivalent
+JSON but not byte-identical between the two: orjson writes NaN and Infinity as
+null (the standard library writes the non-standard NaN/Infinity tokens), may
+format some floats differently, and rejects non-string keys and integers wider
+than 64 bits that the standard library accepts.
+"""
+
+import json
+from typing import Any, Callable, Optional, Union
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+def dumps(obj: Any, indent: bool = False, sort_keys: bool = False,
+          default: Optional[Callable[[Any], Any]] = None) -> str:
+    """
+    Serialize an object to a JSON string
+    
+    Args:
+        obj: Object to serialize
+        indent: Pretty-print with 2-space indentation
+        sort_keys: Sort object keys
+        default: Called for objects that aren't natively serializable
+        
+    Returns:
+        JSON string (compact unless indent is set, non-ASCII characters kept as-is)
+    """
+    if ORJSON_AVAILABLE:
+        option = 0
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=default, option=option).decode("utf-8")
+    
+    separators = (",", ": ") if indent else (",", ":")
+    return json.dumps(obj, indent=2 if indent else None, sort_keys=sort_keys,
+                      separators=separators, ensure_ascii=False, default=default)
+
+def loads(data: Union[str, bytes]) -> Any:
+    """Parse a JSON string or bytes"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
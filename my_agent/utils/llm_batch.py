@@ -0,0 +1,149 @@
+"""
+Batch LLM Client
+Submits many chat requests concurrently with bounded concurrency, retries on
+transient OpenAI errors, and an optional on-disk result cache for resuming
+interrupted batches
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import openai
+from langchain_core.messages import BaseMessage
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Errors worth retrying: rate limits, timeouts, dropped connections and 5xx responses
+TRANSIENT_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+def backoff_delay(attempt: int, initial: float = 0.5, maximum: float = 8.0) -> float:
+    """Exponential backoff with full jitter for the given (0-based) attempt"""
+    return random.uniform(0, min(maximum, initial * (2 ** attempt)))
+
+def invoke_with_retry(model: Any, messages: Any, max_attempts: int = 4, **kwargs: Any) -> Any:
+    """
+    Invoke a model/runnable, retrying transient OpenAI errors with exponential backoff
+    
+    Args:
+        model: LangChain chat model, binding or runnable
+        messages: Input passed to model.invoke
+        max_attempts: Total attempts before the last transient error is raised
+        **kwargs: Extra keyword arguments for model.invoke
+        
+    Returns:
+        The model response
+    """
+    for attempt in range(max_attempts):
+        try:
+            return model.invoke(messages, **kwargs)
+        except TRANSIENT_ERRORS as e:
+            if attempt == max_attempts - 1:
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning(f"Transient error ({type(e).__name__}), retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+def run_sync(coro: Any) -> Any:
+    """Run a coroutine from synchronous code, even if an event loop is already running"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+def messages_key(messages: Sequence[BaseMessage]) -> str:
+    """Stable hash of a message list"""
+    payload = json.dumps([[message.type, message.content] for message in messages], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class BatchLLMClient:
+    """Concurrent, retrying wrapper around a LangChain chat model"""
+
+    def __init__(self, model: Any, max_workers: int = 8, max_attempts: int = 4, cache_path: Optional[str] = None):
+        """
+        Initialize the batch client
+
+        Args:
+            model: LangChain chat model (or binding) supporting ainvoke
+            max_workers: Maximum number of requests in flight
+            max_attempts: Attempts per request for transient errors
+            cache_path: Optional JSON file used to checkpoint completed responses
+        """
+        self.model = model
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.cache_path = cache_path
+        self._cache: Dict[str, str] = {}
+        self._cache_lock = threading.Lock()
+
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path) as f:
+                    self._cache = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable batch cache {cache_path}: {e}")
+
+    async def abatch(self, requests: Sequence[Tuple[str, List[BaseMessage]]]) -> List[Any]:
+        """
+        Run (tag, messages) requests concurrently
+
+        Returns:
+            Response contents in request order; failed requests are returned as the exception
+        """
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def run(tag: str, messages: List[BaseMessage]) -> Any:
+            key = messages_key(messages)
+            if key in self._cache:
+                return self._cache[key]
+            async with semaphore:
+                try:
+                    content = await self._ainvoke_with_retry(tag, messages)
+                except Exception as e:
+                    logger.error(f"Batch request '{tag}' failed: {e}")
+                    return e
+            self._checkpoint(key, content)
+            return content
+
+        return await asyncio.gather(*(run(tag, messages) for tag, messages in requests))
+
+    def batch(self, requests: Sequence[Tuple[str, List[BaseMessage]]]) -> List[Any]:
+        """Synchronous wrapper around abatch"""
+        return run_sync(self.abatch(requests))
+
+    async def _ainvoke_with_retry(self, tag: str, messages: List[BaseMessage]) -> str:
+        for attempt in range(self.max_attempts):
+            try:
+                response = await self.model.ainvoke(messages)
+                return response.content
+            except TRANSIENT_ERRORS as e:
+                if attempt == self.max_attempts - 1:
+                    raise
+                delay = backoff_delay(attempt)
+                logger.warning(f"Transient error on '{tag}' ({type(e).__name__}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    def _checkpoint(self, key: str, content: str) -> None:
+        if not self.cache_path:
+            return
+        with self._cache_lock:
+            self._cache[key] = content
+            try:
+                with open(self.cache_path, "w") as f:
+                    json.dump(self._cache, f)
+            except OSError as e:
+                logger.warning(f"Could not write batch cache {self.cache_path}: {e}")
@@ -0,0 +1,316 @@
+"""
+LLM Response Cache
+In-memory TTL cache for LLM responses with exact-match and semantic (embedding) lookup,
+an optional SQLite store that persists exact matches across processes, and token-count
+helpers for sizing provider prompt-cache prefixes
+"""
+
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+from my_agent.utils.semantic import embed_text, best_match, prefetch_embeddings
+from my_agent.utils import json_utils
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def normalize_query(query: str) -> str:
+    """Normalize a query for cache lookups (case and whitespace insensitive)"""
+    return _WHITESPACE_RE.sub(" ", query.strip().lower())
+
+_WORD_RE = re.compile(r"[a-z0-9][\w'.-]*")
+
+# Words a paraphrase may add, drop or swap without changing what is being asked
+_FILLER_WORDS = frozenset({
+    "a", "an", "the", "of", "in", "on", "for", "to", "with", "by", "from", "at", "as",
+    "me", "my", "i", "we", "us", "you", "please", "can", "could", "would", "will", "do", "does",
+    "show", "list", "display", "find", "get", "give", "fetch", "return", "retrieve", "tell",
+    "what", "which", "who", "are", "is", "was", "were", "be", "all", "there", "that", "this",
+})
+
+def content_words(query: str) -> str:
+    """
+    Lowercase words of a query in order, minus filler words and repeats
+    
+    Used as semantic-cache context so a similarity hit needs the same content words in the
+    same order: "Comedy movies from 2000" / "Drama movies from 2000", "highest rated" /
+    "lowest rated" or "directed by X starring Y" / "starring X directed by Y" never share
+    an entry, while "show all employees" / "list all employees" do.
+    """
+    words = (word for word in _WORD_RE.findall(normalize_query(query)) if word not in _FILLER_WORDS)
+    return " ".join(dict.fromkeys(words))
+
+def hash_text(*parts: str) -> str:
+    """SHA256 hex digest of the given parts"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+# OpenAI only caches prompt prefixes of at least this many tokens
+PROMPT_CACHE_MIN_TOKENS = 1024
+
+@lru_cache(maxsize=1)
+def _get_encoding() -> Any:
+    """Get the gpt-4o tokenizer, or None if tiktoken or its encoding file is unavailable"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning(f"Tokenizer unavailable, estimating token counts from length: {e}")
+        return None
+
+def count_tokens(text: str) -> int:
+    """Count tokens for the gpt-4o family (falls back to ~4 characters per token)"""
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text))
+
+class PersistentResponseStore:
+    """Thread-safe SQLite key/value store for JSON-serializable LLM responses"""
+    
+    def __init__(self, path: str, namespace: str = "", ttl: float = 7 * 24 * 3600, max_entries: int = 10000):
+        """
+        Open (or create) the store
+        
+        Args:
+            path: SQLite database file
+            namespace: Extra key material (e.g. model name and prompt hash) so that
+                entries written by a different model or prompt version never match
+            ttl: Entry lifetime in seconds
+            max_entries: Maximum number of rows kept (oldest are pruned)
+        """
+        self.path = path
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+    
+    def get(self, key: str) -> Optional[Any]:
+        """Get a stored value, or None if it is missing or expired"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM responses WHERE key = ? AND expires_at > ?",
+                (hash_text(self.namespace, key), time.time())
+            ).fetchone()
+        return json_utils.loads(row[0]) if row else None
+    
+    def set(self, key: str, value: Any) -> None:
+        """Store a value, pruning expired and excess rows every 100 writes"""
+        payload = json_utils.dumps(value)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                (hash_text(self.namespace, key), payload, time.time() + self.ttl)
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._conn.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key NOT IN "
+                    "(SELECT key FROM responses ORDER BY expires_at DESC LIMIT ?)",
+                    (self.max_entries,)
+                )
+            self._conn.commit()
+    
+    def clear(self) -> None:
+        """Remove all rows"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+def open_response_store(path: Optional[str], namespace: str = "") -> Optional[PersistentResponseStore]:
+    """
+    Open a persistent store, or return None if persistence is disabled or unavailable
+    
+    Args:
+        path: SQLite database file (empty/None disables persistence)
+        namespace: Key namespace, see PersistentResponseStore
+    """
+    if not path:
+        return None
+    try:
+        return PersistentResponseStore(path, namespace=namespace)
+    except Exception as e:
+        logger.warning(f"Persistent response cache unavailable: {e}")
+        return None
+
+class ResponseCache:
+    """Thread-safe LRU/TTL cache keyed on (tag, context, normalized query)"""
+    
+    def __init__(self, maxsize: int = 512, ttl: float = 3600, similarity: float = 0.92, semantic: bool = True,
+                 store: Optional[PersistentResponseStore] = None):
+        """
+        Initialize the cache
+        
+        Args:
+            maxsize: Maximum number of cached entries (least recently used are evicted)
+            ttl: Entry lifetime in seconds
+            similarity: Minimum cosine similarity for a semantic hit
+            semantic: Whether to fall back to embedding similarity on exact misses
+            store: Optional persistent store consulted on in-memory exact misses
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.similarity = similarity
+        self.semantic = semantic
+        self.store = store
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        # (tag, context hash) -> list of (embedding, entry key)
+        self._vectors: Dict[Tuple[str, str], List[Tuple[List[float], str]]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+    
+    def get(self, tag: str, query: str, context: str = "") -> Optional[Any]:
+        """
+        Look up a cached value
+        
+        Args:
+            tag: Name of the calling method
+            query: User query the value was produced for
+            context: Extra text the value depends on (e.g. the system prompt)
+            
+        Returns:
+            The cached value, or None on a miss
+        """
+        normalized = normalize_query(query)
+        context_hash = hash_text(context)
+        key = hash_text(tag, context_hash, normalized)
+        
+        value = self._get_entry(key)
+        if value is not None:
+            with self._lock:
+                self.hits += 1
+            return value
+        
+        if self.store is not None:
+            value = self._get_stored(key)
+            if value is not None:
+                self._put_entry(key, value)
+                with self._lock:
+                    self.persistent_hits += 1
+                return value
+        
+        if self.semantic:
+            vectors = self._vectors.get((tag, context_hash))
+            if vectors:
+                try:
+                    index, score = best_match(embed_text(normalized), [vector for vector, _ in vectors])
+                except Exception as e:
+                    logger.warning(f"Semantic cache lookup disabled: {e}")
+                    self.semantic = False
+                    index, score = -1, 0.0
+                if index >= 0 and score >= self.similarity:
+                    value = self._get_entry(vectors[index][1])
+                    if value is not None:
+                        with self._lock:
+                            self.semantic_hits += 1
+                        return value
+        
+        with self._lock:
+            self.misses += 1
+        return None
+    
+    def set(self, tag: str, query: str, value: Any, context: str = "") -> None:
+        """Store a value for (tag, context, query)"""
+        normalized = normalize_query(query)
+        context_hash = hash_text(context)
+        key = hash_text(tag, context_hash, normalized)
+        
+        self._put_entry(key, value)
+        if self.store is not None:
+            try:
+                self.store.set(key, value)
+            except (sqlite3.Error, TypeError, ValueError) as e:
+                logger.warning(f"Could not persist cached response: {e}")
+        
+        if self.semantic:
+            try:
+                vector = embed_text(normalized)
+            except Exception as e:
+                logger.warning(f"Semantic cache indexing disabled: {e}")
+                self.semantic = False
+                return
+            with self._lock:
+                vectors = self._vectors.setdefault((tag, context_hash), [])
+                # Drop vectors whose entries were evicted or expired
+                vectors[:] = [(v, k) for v, k in vectors if k in self._entries and k != key]
+                vectors.append((vector, key))
+    
+    def prefetch(self, queries: List[str]) -> None:
+        """Embed several queries with one API call ahead of their get/set calls"""
+        if not self.semantic:
+            return
+        try:
+            prefetch_embeddings([normalize_query(query) for query in queries])
+        except Exception as e:
+            logger.warning(f"Semantic cache prefetch failed: {e}")
+    
+    def clear(self) -> None:
+        """Remove all in-memory entries (the persistent store is left intact)"""
+        with self._lock:
+            self._entries.clear()
+            self._vectors.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "persistent_hits": self.persistent_hits,
+                "misses": self.misses
+            }
+    
+    def _put_entry(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def _get_stored(self, key: str) -> Optional[Any]:
+        try:
+            return self.store.get(key)
+        except (sqlite3.Error, ValueError) as e:
+            logger.warning(f"Persistent cache lookup failed: {e}")
+            return None
+    
+    def _get_entry(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
@@ -1,30 +1,27 @@
 from typing import Dict, Any
-import os
-from dotenv import load_dotenv
+from functools import lru_cache
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, AIMessage
 from my_agent.utils.state import ChatState
+from my_agent.utils.env import GEMINI_KEY
 
-# Load environment variables
-load_dotenv()
+@lru_cache(maxsize=1)
+def _get_model() -> ChatGoogleGenerativeAI:
+    """Create the Gemini chat model once and reuse it across calls"""
+    return ChatGoogleGenerativeAI(
+        model="gemini-2.0-flash-lite",
+        google_api_key=GEMINI_KEY
+    )
 
 def chat_node(state: ChatState) -> ChatState:
     """
     Simple chat node that processes the latest message and generates a response using Gemini.
     """
-    # Get the latest message (assuming it's from the user)
-    messages = state["messages"]
-    
-    # Create Gemini chat model using the API key from .env
-    model = ChatGoogleGenerativeAI(
-        model="gemini-2.0-flash-lite",
-        google_api_key=os.getenv("GEMINI_KEY")
-    )
-    
-    # Generate response
-    response = model.invoke(messages)
+    # Gemini chat model using the API key from .env
+    model = _get_model()
     
-    # Add the AI response to the messages
-    messages.append(response)
+    # Generate response from the conversation so far
+    response = model.invoke(state["messages"])
     
-    return {"messages": messages} 
\ No newline at end of file
+    # Return only the new message; the add_messages reducer appends it
+    return {"messages": [response]}
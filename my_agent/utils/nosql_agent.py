@@ -6,18 +6,34 @@ Returns structured JSON output with query and results
 """
 
 import os
-import json
-from typing import Dict, List, Any, Optional
+import asyncio
+import importlib.util
+import itertools
+import random
+import re
+from functools import cached_property, lru_cache
+from typing import Dict, Iterator, List, Any, Optional, Tuple, Union
 from datetime import datetime
-from dotenv import load_dotenv
+from bson import DBRef, ObjectId
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, TEXT, ReadPreference
+from pymongo.errors import OperationFailure
 from mongoengine import connect, Document, StringField, IntField, ListField, DateTimeField, ReferenceField, EmbeddedDocumentField, EmbeddedDocument, FloatField, DictField
+import httpx
+from pydantic import BaseModel, ValidationError
 from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable
+from my_agent.utils.llm_cache import ResponseCache, open_response_store, hash_text, normalize_query, content_words, count_tokens, PROMPT_CACHE_MIN_TOKENS
+from my_agent.utils.env import LLM_CACHE_PATH, OPENAI_KEY, load_env
+from my_agent.utils import json_utils
 import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 import time
 
-# Load environment variables
-load_dotenv()
+# Load environment variables (no-op if already loaded in this process)
+load_env()
 
 # Configure logging
 logging.basicConfig(
@@ -27,6 +43,315 @@ logging.basicConfig(
 )
 logger = logging.getLogger("NoSQLAgent")
 
+# Filler appended to the system prompt so the static prefix reaches OpenAI's prompt-cache minimum
+_CACHE_PADDING_LINE = "# --- CACHE PREFIX PADDING ---\n"
+
+# Where a generated query came from (reported as "source" in generate_and_execute_query results)
+_SOURCE_LLM = "llm"
+_SOURCE_CACHE = "cache"
+_SOURCE_FAST_PATH = "fast_path"
+
+# Server error code for operations the user has no privilege for
+_UNAUTHORIZED = 13
+
+# Markdown code fences (```json / ```) around a generated query
+_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.MULTILINE)
+
+class MongoQuery(BaseModel):
+    """Structured output schema for a generated find query or aggregation pipeline"""
+    collection: Optional[str] = None
+    query: Optional[Dict[str, Any]] = None
+    projection: Optional[Dict[str, Any]] = None
+    pipeline: Optional[List[Dict[str, Any]]] = None
+
+def _parse_generated_query(message: BaseMessage) -> str:
+    """
+    Validate a JSON-mode model response against MongoQuery and return it as compact JSON
+    
+    A response that doesn't validate is returned as text (fences stripped) so execution
+    reports the problem like any other bad query.
+    """
+    content = message.content if isinstance(message.content, str) else str(message.content)
+    try:
+        parsed = MongoQuery.model_validate_json(content)
+    except ValidationError as e:
+        logger.warning(f"Generated query failed schema validation: {e}")
+        return _FENCE_RE.sub("", content).strip()
+    return json_utils.dumps(parsed.model_dump(exclude_none=True))
+
+def _match_fields(predicate: Dict[str, Any]) -> Optional[set]:
+    """
+    Collect the top-level field names a $match predicate references
+    
+    Returns:
+        Set of root field names, or None if the predicate can't be analyzed ($expr, $where, ...)
+    """
+    fields = set()
+    for key, value in predicate.items():
+        if key in ("$and", "$or", "$nor"):
+            for clause in value:
+                clause_fields = _match_fields(clause)
+                if clause_fields is None:
+                    return None
+                fields |= clause_fields
+        elif key.startswith("$"):
+            return None
+        else:
+            fields.add(key.split(".", 1)[0])
+    return fields
+
+def _filter_paths(predicate: Dict[str, Any]) -> set:
+    """Collect the field paths (dotted, as written) a find/$match filter references"""
+    paths = set()
+    for key, value in predicate.items():
+        if key in ("$and", "$or", "$nor") and isinstance(value, list):
+            for clause in value:
+                if isinstance(clause, dict):
+                    paths |= _filter_paths(clause)
+        elif not key.startswith("$"):
+            paths.add(key)
+    return paths
+
+def _inclusion_projection(paths: set) -> Dict[str, int]:
+    """Build an inclusion projection, skipping paths inside another included path (MongoDB rejects the collision)"""
+    return {path: 1 for path in sorted(paths) if not any(path.startswith(other + ".") for other in paths)}
+
+def _is_match(stage: Any) -> bool:
+    """Check whether a pipeline stage is a $match stage"""
+    return isinstance(stage, dict) and len(stage) == 1 and "$match" in stage
+
+def _merge_matches(first: Dict[str, Any], second: Dict[str, Any]) -> Dict[str, Any]:
+    """Combine two adjacent $match predicates into one"""
+    if first.keys().isdisjoint(second.keys()):
+        return {**first, **second}
+    return {"$and": [first, second]}
+
+def _project_sources(projection: Any) -> Optional[Dict[str, str]]:
+    """
+    Map the fields a $project outputs to the source field paths they copy
+    
+    Returns:
+        {output path: source path} for pass-through (field: 1) and rename ("$field")
+        projections, or None if the projection computes or excludes anything else
+    """
+    if not isinstance(projection, dict):
+        return None
+    sources = {"_id": "_id"}
+    for field, value in projection.items():
+        if value is True or (isinstance(value, int) and not isinstance(value, bool) and value == 1):
+            sources[field] = field
+        elif field == "_id" and value in (0, False):
+            sources.pop("_id")
+        elif isinstance(value, str) and value.startswith("$") and not value.startswith("$$"):
+            sources[field] = value[1:]
+        else:
+            return None
+    return sources
+
+def _project_passes_through(projection: Any, fields: set) -> bool:
+    """Check whether a $project leaves the given root fields unchanged, so a $match on them can run first"""
+    if not isinstance(projection, dict):
+        return False
+    values = [value for field, value in projection.items() if field != "_id"]
+    if values and all(value in (0, False) for value in values):
+        excluded = {field.split(".", 1)[0] for field, value in projection.items() if value in (0, False)}
+        return fields.isdisjoint(excluded)
+    # Inclusion projection: each field must be kept as is ('_id' is kept unless excluded)
+    return all(projection.get(field, 1 if field == "_id" else 0) in (1, True) for field in fields)
+
+def _substitute_fields(expression: Any, sources: Dict[str, str]) -> Any:
+    """
+    Rewrite field references in an expression through a $project's source map
+    
+    Raises:
+        ValueError: If a reference can't be resolved to a source field
+    """
+    if isinstance(expression, str):
+        if expression.startswith("$$"):
+            if expression.split(".", 1)[0] in ("$$ROOT", "$$CURRENT"):
+                raise ValueError("whole-document reference")
+            return expression
+        if not expression.startswith("$"):
+            return expression
+        path = expression[1:]
+        for output, source in sources.items():
+            if path == output or path.startswith(output + "."):
+                return "$" + source + path[len(output):]
+        raise ValueError(f"unresolved field reference {expression}")
+    if isinstance(expression, list):
+        return [_substitute_fields(item, sources) for item in expression]
+    if isinstance(expression, dict):
+        return {key: value if key == "$literal" else _substitute_fields(value, sources)
+                for key, value in expression.items()}
+    return expression
+
+def _flatten_singletons(expression: Any) -> Any:
+    """Replace single-element array lookups ({"$arrayElemAt": [[expr], 0]}) with expr"""
+    if isinstance(expression, list):
+        return [_flatten_singletons(item) for item in expression]
+    if not isinstance(expression, dict):
+        return expression
+    expression = {key: value if key == "$literal" else _flatten_singletons(value)
+                  for key, value in expression.items()}
+    if len(expression) == 1:
+        (operator, args), = expression.items()
+        if (operator == "$arrayElemAt" and isinstance(args, list) and len(args) == 2
+                and isinstance(args[0], list) and len(args[0]) == 1 and args[1] in (0, -1)):
+            return args[0][0]
+    return expression
+
+def _inline_project(projection: Any, group: Any) -> Optional[Dict[str, Any]]:
+    """
+    Rewrite a $group to read the fields of the $project right before it directly
+    
+    Returns:
+        The rewritten $group spec, or None if the $project can't safely be dropped
+    """
+    sources = _project_sources(projection)
+    if sources is None or not isinstance(group, dict):
+        return None
+    try:
+        return _substitute_fields(group, sources)
+    except ValueError:
+        return None
+
+# Stages that only filter, order or page the source documents, leaving their fields as they are
+_PASS_THROUGH_STAGES = frozenset({"$match", "$sort", "$limit", "$skip", "$sample"})
+
+# Stages that map each input document to exactly one output document
+_ONE_TO_ONE_STAGES = frozenset({"$project", "$addFields", "$set", "$unset"})
+
+def _apply_limit(pipeline: List[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+    """
+    Cap a pipeline's output with a $limit stage unless it already has one
+    
+    The limit goes right after the last $sort when only one-to-one stages follow it, so
+    mongod can coalesce the $sort and $limit into a top-k sort; otherwise it is appended.
+    """
+    if any(isinstance(stage, dict) and "$limit" in stage for stage in pipeline):
+        return pipeline
+    position = len(pipeline)
+    for index in range(len(pipeline) - 1, -1, -1):
+        stage = pipeline[index]
+        if isinstance(stage, dict) and "$sort" in stage:
+            position = index + 1
+            break
+        if not (isinstance(stage, dict) and len(stage) == 1 and next(iter(stage)) in _ONE_TO_ONE_STAGES):
+            break
+    return pipeline[:position] + [{"$limit": limit}] + pipeline[position:]
+
+def _optimize_pipeline(pipeline: List[Dict[str, Any]], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Rewrite an aggregation pipeline so filters run as early as possible
+    
+    A $match that only references fields of the source documents is moved above any
+    preceding $lookup/$unwind stages that don't produce those fields and $project stages
+    that pass them through unchanged, so mongod filters before joining/unwinding/reshaping
+    (and can use indexes). Adjacent $match stages are merged,
+    a $project that only passes through or renames fields for the $group right after it
+    is inlined into the group, and single-element array lookups are flattened.
+    
+    Args:
+        pipeline: Aggregation pipeline
+        limit: Maximum number of output documents, enforced with a $limit stage when the
+            pipeline has none
+        
+    Returns:
+        Equivalent pipeline with $match stages hoisted and merged
+    """
+    optimized: List[Dict[str, Any]] = []
+    for stage in pipeline:
+        if not _is_match(stage):
+            optimized.append(stage)
+            continue
+        
+        predicate = stage["$match"]
+        fields = _match_fields(predicate) if isinstance(predicate, dict) else None
+        position = len(optimized)
+        if fields is not None:
+            while position > 0:
+                previous = optimized[position - 1]
+                if _is_match(previous):
+                    # Filters commute with each other
+                    produced = set()
+                elif "$lookup" in previous:
+                    produced = {previous["$lookup"].get("as", "").split(".", 1)[0]}
+                elif "$unwind" in previous:
+                    unwind = previous["$unwind"]
+                    path = unwind.get("path", "") if isinstance(unwind, dict) else unwind
+                    produced = {path.lstrip("$").split(".", 1)[0]}
+                    if isinstance(unwind, dict) and unwind.get("includeArrayIndex"):
+                        produced.add(unwind["includeArrayIndex"].split(".", 1)[0])
+                elif "$project" in previous and len(previous) == 1:
+                    if not _project_passes_through(previous["$project"], fields):
+                        break
+                    produced = set()
+                else:
+                    break
+                if fields & produced:
+                    break
+                position -= 1
+        
+        optimized.insert(position, stage)
+    
+    # Fold runs of adjacent $match stages into one
+    merged: List[Dict[str, Any]] = []
+    for stage in optimized:
+        if (merged and _is_match(stage) and _is_match(merged[-1])
+                and isinstance(stage["$match"], dict) and isinstance(merged[-1]["$match"], dict)):
+            merged[-1] = {"$match": _merge_matches(merged[-1]["$match"], stage["$match"])}
+        else:
+            merged.append(stage)
+    
+    # Drop a $project whose fields the following $group can read directly
+    inlined: List[Dict[str, Any]] = []
+    for stage in merged:
+        if isinstance(stage, dict) and "$group" in stage and len(stage) == 1 and inlined:
+            previous = inlined[-1]
+            if isinstance(previous, dict) and len(previous) == 1 and "$project" in previous:
+                group = _inline_project(previous["$project"], stage["$group"])
+                if group is not None:
+                    inlined[-1] = {"$group": group}
+                    continue
+        inlined.append(stage)
+    optimized = [_flatten_singletons(stage) for stage in inlined]
+    return _apply_limit(optimized, limit) if limit is not None else optimized
+
+# Encoders for the BSON types that JSON encoders don't handle natively, keyed by exact type
+_BSON_ENCODERS = {
+    ObjectId: str,
+    datetime: datetime.isoformat,
+    DBRef: lambda ref: str(ref.id)
+}
+
+def _bson_default(obj: Any) -> Any:
+    """Serialize the BSON types that JSON encoders don't handle natively"""
+    encoder = _BSON_ENCODERS.get(type(obj))
+    if encoder is not None:
+        return encoder(obj)
+    # Subclasses (rare in driver output) take the slower isinstance path
+    for bson_type, encoder in _BSON_ENCODERS.items():
+        if isinstance(obj, bson_type):
+            return encoder(obj)
+    # Anything else (Decimal128, Binary, Regex, Timestamp, MinKey/MaxKey, ...) is rendered as
+    # its string form rather than failing the whole query
+    return str(obj)
+
+def _convert_to_dict(results: List[Any], as_json: bool = False) -> Any:
+    """
+    Convert MongoEngine documents / raw BSON results to JSON-friendly data
+    
+    The whole result is encoded in one pass by the (C) JSON encoder; only ObjectId,
+    datetime and DBRef values call back into Python.
+    
+    Args:
+        results: Documents or dicts returned by a cursor
+        as_json: Return the JSON string instead of parsing it back into Python objects
+    """
+    raw = [doc.to_mongo() if hasattr(doc, 'to_mongo') else doc for doc in results]
+    encoded = json_utils.dumps(raw, default=_bson_default)
+    return encoded if as_json else json_utils.loads(encoded)
+
 # MongoEngine Document Models
 class ImdbInfo(EmbeddedDocument):
     """Embedded document for IMDB information"""
@@ -143,48 +468,264 @@ class Theater(Document):
         'collection': 'theaters'
     }
 
-class NoSQLQueryExecutor:
-    """NoSQL Query Executor for Sample Mflix Database using MongoEngine"""
+@lru_cache(maxsize=None)
+def _connect(connection_string: str) -> Any:
+    """
+    Open the MongoEngine connection for a connection string once per process
     
-    def __init__(self, connection_string: str = None):
-        """
-        Initialize the NoSQL Query Executor
-        
-        Args:
-            connection_string: MongoDB connection string (defaults to MONGO_DB from .env)
-        """
-        self.connection_string = connection_string or os.getenv("MONGO_DB")
-        if not self.connection_string:
-            raise ValueError("MongoDB connection string not found. Set MONGO_DB in .env file")
-        
-        # Connect to MongoDB using MongoEngine
-        try:
-            # Extract database name from connection string
-            db_name = "sample_mflix"
-            if "mongodb+srv://" in self.connection_string:
-                # For Atlas connections, we need to specify the database name
-                connect(db=db_name, host=self.connection_string)
-            else:
-                # For local connections
-                connect(db=db_name, host=self.connection_string)
-            
-            print("Successfully connected to MongoDB using MongoEngine!")
-            
-        except Exception as e:
-            print(f"Failed to connect to MongoDB: {e}")
-            raise e
-        
-        self.model = ChatOpenAI(
-            model="gpt-4o-mini",
-            api_key=os.getenv("OPENAPI_KEY")
-        )
-        
-        # Database schema context
-        self.db_context = self._build_database_context()
+    Every executor reuses the returned client, so they share one connection pool and
+    one set of monitoring threads instead of each opening its own.
+    """
+    # The database name is always sample_mflix, including for Atlas (mongodb+srv://) hosts.
+    # A small bounded pool with a few warm connections (so the first queries skip the TCP/TLS
+    # handshake), and wire compression for the large movie documents where available
+    compressors = [name for name, module in (("zstd", "zstandard"), ("snappy", "snappy"))
+                   if importlib.util.find_spec(module) is not None] + ["zlib"]
+    client = connect(
+        db="sample_mflix",
+        host=connection_string,
+        maxPoolSize=20,
+        minPoolSize=4,
+        maxIdleTimeMS=60000,
+        waitQueueTimeoutMS=5000,
+        compressors=",".join(compressors)
+    )
+    logger.info("Successfully connected to MongoDB using MongoEngine!")
+    return client
+
+@lru_cache(maxsize=1)
+def _get_http_clients() -> Tuple[httpx.Client, httpx.AsyncClient]:
+    """
+    Get the HTTP clients shared by every chat model in this module
+    
+    Batched generation runs several requests at once; with HTTP/2 (when the optional h2
+    package is installed) they are multiplexed over one TLS connection instead of each
+    opening its own.
+    """
+    http2 = importlib.util.find_spec("h2") is not None
+    limits = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+    return httpx.Client(http2=http2, limits=limits), httpx.AsyncClient(http2=http2, limits=limits)
+
+@lru_cache(maxsize=None)
+def _get_model(model_name: str = "gpt-4o-mini", api_key: Optional[str] = None) -> ChatOpenAI:
+    """Get the chat model shared by all executors (one HTTP connection pool per model/key)"""
+    http_client, http_async_client = _get_http_clients()
+    return ChatOpenAI(
+        model=model_name,
+        api_key=api_key,
+        http_client=http_client,
+        http_async_client=http_async_client
+    )
+
+# Collections a generated query may target
+_COLLECTIONS = {
+    'movies': Movie,
+    'comments': Comment,
+    'users': User,
+    'sessions': Session,
+    'theaters': Theater
+}
+
+# Read-only aggregation stages a generated pipeline may use
+_ALLOWED_STAGES = frozenset({
+    "$match", "$lookup", "$unwind", "$project", "$group", "$sort", "$limit", "$skip",
+    "$count", "$addFields", "$set", "$unset", "$sortByCount", "$facet", "$bucket", "$sample"
+})
+
+# Operators that write to the database or run server-side JavaScript; rejected at any depth
+_FORBIDDEN_OPERATORS = frozenset({"$out", "$merge", "$function", "$accumulator", "$where"})
+
+def _find_forbidden(value: Any) -> Optional[str]:
+    """Return the first forbidden operator used anywhere in a query, if any"""
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key in _FORBIDDEN_OPERATORS:
+                return key
+            found = _find_forbidden(item)
+            if found:
+                return found
+    elif isinstance(value, list):
+        for item in value:
+            found = _find_forbidden(item)
+            if found:
+                return found
+    return None
+
+def _infer_collection(pipeline: Any) -> str:
+    """
+    Guess the source collection of a pipeline that doesn't name one
+    
+    Uses the fields the first $match filters on and the localField of $lookup stages (both
+    read from the source documents), and picks the first collection whose model defines
+    all of them; movies when nothing is conclusive.
+    """
+    fields = set()
+    for index, stage in enumerate(pipeline if isinstance(pipeline, list) else []):
+        if not isinstance(stage, dict):
+            continue
+        if index == 0 and isinstance(stage.get("$match"), dict):
+            fields |= _match_fields(stage["$match"]) or set()
+        lookup = stage.get("$lookup")
+        if isinstance(lookup, dict) and isinstance(lookup.get("localField"), str):
+            fields.add(lookup["localField"].split(".", 1)[0])
+    fields.discard("_id")
+    for name, document_class in _COLLECTIONS.items():
+        if fields and fields <= set(document_class._fields):
+            logger.info(f"Inferred collection '{name}' from pipeline fields {sorted(fields)}")
+            return name
+    return "movies"
+
+def _validate_query(query_dict: Any) -> None:
+    """
+    Check a parsed generated query before it is sent to MongoDB
+    
+    Args:
+        query_dict: {"collection", "pipeline"} or {"collection", "query", "projection"} object
         
-    def _build_database_context(self) -> str:
-        """Build concise database context for sample_mflix schema using MongoEngine models"""
-        context = """
+    Raises:
+        ValueError: If the query is malformed, targets an unknown collection, or uses a
+            stage/operator outside the read-only allowlist
+    """
+    if not isinstance(query_dict, dict):
+        raise ValueError("Query must be a JSON object")
+    collection_name = query_dict.get('collection', 'movies')
+    if collection_name not in _COLLECTIONS:
+        raise ValueError(f"Unknown collection: {collection_name}")
+    
+    if 'pipeline' in query_dict:
+        pipeline = query_dict['pipeline']
+        if not isinstance(pipeline, list):
+            raise ValueError("Pipeline must be a list of stages")
+        for stage in pipeline:
+            if not isinstance(stage, dict) or len(stage) != 1:
+                raise ValueError(f"Pipeline stage must be a single-key object: {stage}")
+            name = next(iter(stage))
+            if name not in _ALLOWED_STAGES:
+                raise ValueError(f"Pipeline stage not allowed: {name}")
+            if name == "$limit" and (not isinstance(stage[name], int) or isinstance(stage[name], bool) or stage[name] <= 0):
+                raise ValueError(f"$limit must be a positive integer: {stage[name]}")
+    else:
+        if not isinstance(query_dict.get('query', {}), dict):
+            raise ValueError("Find query must be an object")
+        projection = query_dict.get('projection') or {}
+        if not isinstance(projection, dict):
+            raise ValueError("Projection must be an object")
+        excluded = {value in (0, False) for field, value in projection.items() if field != '_id'}
+        if len(excluded) > 1:
+            raise ValueError(f"Projection cannot mix inclusion and exclusion (other than '_id'): {projection}")
+    
+    forbidden = _find_forbidden(query_dict)
+    if forbidden:
+        raise ValueError(f"Operator not allowed: {forbidden}")
+
+# Templated prompts answered without the LLM: (pattern, filter builder). The verb/noun prefix
+# is case-insensitive, names must be capitalized so "starring Tom Hanks and Meg Ryan" falls through
+_MOVIES_PREFIX = r"(?i:(?:(?:show|find|list|get|give)\s+(?:me\s+)?)?(?:all\s+|the\s+)?(?:movies|films))"
+_NAME = r"([A-Z][\w'.-]*(?:\s+[A-Z][\w'.-]*)*)"
+_FAST_PATH_PATTERNS = [
+    (re.compile(_MOVIES_PREFIX + r"\s+(?i:from|released in|made in|in)\s+(\d{4})"),
+     lambda m: {"year": int(m[1])}),
+    (re.compile(_MOVIES_PREFIX + r"\s+(?i:from|released in|made in|in)\s+(?i:the)\s+(\d{3})0s"),
+     lambda m: {"year": {"$gte": int(m[1]) * 10, "$lt": int(m[1]) * 10 + 10}}),
+    (re.compile(_MOVIES_PREFIX + r"\s+(?i:starring|with actor)\s+" + _NAME),
+     lambda m: {"cast": m[1]}),
+    (re.compile(_MOVIES_PREFIX + r"\s+(?i:directed by)\s+" + _NAME),
+     lambda m: {"directors": m[1]}),
+    (re.compile(_MOVIES_PREFIX + r"\s+(?i:with (?:a )?runtime (?:over|above|longer than|of more than))"
+                r"\s+(\d+)\s+(?i:(hours?|minutes?|mins?))"),
+     lambda m: {"runtime": {"$gt": int(m[1]) * (60 if m[2].lower().startswith("hour") else 1)}}),
+]
+
+# Sample prompts offered by get_sample_queries and the interactive chat
+_SAMPLE_QUERIES = (
+    "Show all movies from 2020",
+    "Find action movies with high ratings",
+    "Show movies with the most comments",
+    "List top rated directors",
+    "Find movies starring Tom Hanks",
+    "Show movies with awards",
+    "List movies by genre",
+    "Find movies released in the 1990s",
+    "Show movies with high IMDB ratings",
+    "Find movies with specific cast members",
+    "Show movies with plot summaries",
+    "List movies by country",
+    "Find movies with specific directors",
+    "Show movies with runtime over 2 hours",
+    "Find movies with specific awards"
+)
+
+def _freeze_query(query_dict: Dict[str, Any]) -> str:
+    """Validate a hand-written query and encode it once"""
+    _validate_query(query_dict)
+    return json_utils.dumps(query_dict)
+
+def _count_by(field: str) -> Dict[str, Any]:
+    """Pipeline counting movies per element of an array field"""
+    return {"collection": "movies", "pipeline": [
+        {"$unwind": f"${field}"},
+        {"$group": {"_id": f"${field}", "movie_count": {"$sum": 1}}},
+        {"$sort": {"movie_count": -1}}
+    ]}
+
+def _top_movies(match: Dict[str, Any], sort_field: str, *fields: str) -> Dict[str, Any]:
+    """Pipeline returning the matching movies with the highest sort_field"""
+    return {"collection": "movies", "pipeline": [
+        {"$match": match},
+        {"$sort": {sort_field: -1}},
+        {"$limit": 20},
+        {"$project": {"title": 1, "year": 1, sort_field: 1, **{field: 1 for field in fields}, "_id": 0}}
+    ]}
+
+def _movies_having(field: str, is_array: bool = False) -> Dict[str, Any]:
+    """Find query for movies where an array or string field is present and not empty"""
+    condition = {f"{field}.0": {"$exists": True}} if is_array else {field: {"$exists": True, "$ne": ""}}
+    return {"collection": "movies", "query": condition,
+            "projection": {"title": 1, "year": 1, field: 1, "_id": 0}}
+
+# Hand-written queries for the sample prompts the patterns above don't cover, keyed by
+# normalized prompt, so the demo path never waits on the LLM
+_CANNED_QUERIES = {normalize_query(prompt): _freeze_query(query) for prompt, query in (
+    ("Find action movies with high ratings", _top_movies({"genres": "Action", "imdb.rating": {"$gte": 7}}, "imdb.rating")),
+    ("Show movies with the most comments", _top_movies({"num_mflix_comments": {"$gt": 0}}, "num_mflix_comments")),
+    ("List top rated directors", {"collection": "movies", "pipeline": [
+        {"$unwind": "$directors"},
+        {"$group": {"_id": "$directors", "avg_rating": {"$avg": "$imdb.rating"}, "movie_count": {"$sum": 1}}},
+        {"$match": {"avg_rating": {"$gte": 7}}},
+        {"$sort": {"avg_rating": -1}},
+        {"$limit": 10}
+    ]}),
+    ("Show movies with awards", _top_movies({"awards.wins": {"$gte": 1}}, "awards.wins", "awards.text")),
+    ("List movies by genre", _count_by("genres")),
+    ("Show movies with high IMDB ratings", _top_movies({"imdb.rating": {"$gte": 8}}, "imdb.rating")),
+    ("Find movies with specific cast members", _movies_having("cast", is_array=True)),
+    ("Show movies with plot summaries", _movies_having("plot")),
+    ("List movies by country", _count_by("countries")),
+    ("Find movies with specific directors", _movies_having("directors", is_array=True)),
+    ("Find movies with specific awards", _movies_having("awards.text")),
+)}
+
+def _fast_path_query(prompt: str) -> Optional[str]:
+    """
+    Get the query for a sample prompt or a templated one ("Movies from 2020", "Movies starring Tom Hanks")
+    
+    Returns:
+        Compact JSON query, or None if the prompt needs the LLM
+    """
+    canned = _CANNED_QUERIES.get(normalize_query(prompt))
+    if canned is not None:
+        return canned
+    text = prompt.strip().rstrip(".?!")
+    for pattern, build_filter in _FAST_PATH_PATTERNS:
+        match = pattern.fullmatch(text)
+        if match:
+            find_query = build_filter(match)
+            projection = {"title": 1, "year": 1, **{field: 1 for field in find_query}, "_id": 0}
+            return json_utils.dumps({"collection": "movies", "query": find_query, "projection": projection})
+    return None
+
+# Schema context for the sample_mflix MongoEngine models
+_DB_CONTEXT = """
 MONGODB DATABASE SCHEMA FOR SAMPLE_MFLIX (MongoEngine Models)
 
 DATABASE: sample_mflix
@@ -243,90 +784,428 @@ MongoEngine Query Patterns:
 - Text search: Movie.objects.search_text('search term')
 - Geospatial: Theater.objects.filter(location__geo__near=[longitude, latitude])
 """
-        return context
+
+# Query-generation system prompt (schema context plus instructions and examples). It is the
+# static prefix of every generation request, so it must never contain per-call data
+_SYSTEM_PROMPT = """
+You are a MongoDB query generator for the Sample Mflix Database using MongoEngine ODM. 
+
+""" + _DB_CONTEXT + """
+
+INSTRUCTIONS:
+1. Generate ONLY valid MongoDB queries (find operations) or aggregation pipelines
+2. Use appropriate $lookup for joining collections (e.g., comments with movies)
+3. Use $match for filtering conditions (genre, year, cast, director, etc.)
+4. Use $project for field selection
+5. Use $sort for meaningful ordering
+6. Use $limit to limit results (default 20 if not specified)
+7. Return ONLY the MongoDB query in JSON format, no explanations
+8. Movies queries without a projection return only title, year, imdb.rating and the filtered/sorted
+   fields; other find queries without a projection omit users.password and sessions.jwt.
+   Project every field the answer needs
+9. Results are capped at 50 documents
+
+FOR FIND QUERIES, return format:
+{
+  "collection": "collection_name",
+  "query": { "field": "value" },
+  "projection": { "field": 1, "_id": 0 }
+}
+
+FOR AGGREGATION PIPELINES, return format:
+{
+  "collection": "collection_name",
+  "pipeline": [
+    { "$match": { "field": "value" } },
+    { "$lookup": { "from": "collection", "localField": "field", "foreignField": "field", "as": "alias" } },
+    { "$project": { "field": 1 } }
+  ]
+}
+
+EXAMPLE PROMPTS AND QUERIES:
+- "Show all movies": { "collection": "movies", "query": {}, "projection": { "title": 1, "year": 1, "genres": 1, "_id": 0 } }
+- "Movies from 2020": { "collection": "movies", "query": { "year": 2020 }, "projection": { "title": 1, "year": 1, "_id": 0 } }
+- "Action movies with high ratings": { "collection": "movies", "pipeline": [{ "$match": { "genres": "Action", "imdb.rating": { "$gte": 7 } } }, { "$project": { "title": 1, "imdb.rating": 1, "year": 1, "_id": 0 } }, { "$sort": { "imdb.rating": -1 } }, { "$limit": 20 }] }
+- "Movies with comments": { "collection": "movies", "pipeline": [{ "$lookup": { "from": "comments", "localField": "_id", "foreignField": "movie_id", "as": "comments" } }, { "$match": { "comments": { "$ne": [] } } }, { "$project": { "title": 1, "comment_count": { "$size": "$comments" }, "_id": 0 } }, { "$sort": { "comment_count": -1 } }] }
+- "Top rated directors": { "collection": "movies", "pipeline": [{ "$unwind": "$directors" }, { "$group": { "_id": "$directors", "avg_rating": { "$avg": "$imdb.rating" }, "movie_count": { "$sum": 1 } } }, { "$match": { "avg_rating": { "$gte": 7 } } }, { "$sort": { "avg_rating": -1 } }, { "$limit": 10 }] }
+"""
+
+class NoSQLQueryExecutor:
+    """NoSQL Query Executor for Sample Mflix Database using MongoEngine"""
+    
+    # Indexes on the fields the schema context and examples filter/sort/join on
+    REQUIRED_INDEXES = {
+        Movie: [
+            [("year", ASCENDING)],
+            [("genres", ASCENDING), ("imdb.rating", DESCENDING)],
+            [("imdb.rating", DESCENDING)],
+            [("directors", ASCENDING)],
+            [("cast", ASCENDING)],
+            [("released", ASCENDING)],
+            [("runtime", ASCENDING)],
+            [("num_mflix_comments", DESCENDING)],
+            # Backs Movie.objects.search_text / $text (a collection has at most one text index)
+            [("title", TEXT), ("plot", TEXT)]
+        ],
+        Comment: [
+            # Serves movie_id lookups/joins and returns a movie's comments newest first
+            [("movie_id", ASCENDING), ("date", DESCENDING)]
+        ],
+        User: [
+            [("email", ASCENDING)]
+        ],
+        Session: [
+            [("user_id", ASCENDING)]
+        ],
+        Theater: [
+            [("location.geo", GEOSPHERE)]
+        ]
+    }
+    
+    # Server-side cap on the documents a generated query returns when it sets no $limit
+    DEFAULT_LIMIT = 50
+    
+    # Let $sort/$group spill to disk instead of failing at the 100MB in-memory stage limit
+    ALLOW_DISK_USE = True
+    
+    # Server-side time limit for generated queries, so a runaway scan is aborted by mongod
+    MAX_TIME_MS = 30000
+    
+    # Generated queries are read-only analytics, so replica set secondaries can serve them
+    READ_PREFERENCE = ReadPreference.SECONDARY_PREFERRED
+    
+    # Fields returned when a find query (or a pipeline that only filters/sorts) projects nothing;
+    # the filtered and sorted fields are added. Movies are wide, most callers only need these
+    DEFAULT_FIELDS = {
+        "movies": ("title", "year", "imdb.rating")
+    }
+    
+    # Bulky or sensitive fields left out of unprojected find results in the other collections
+    DEFAULT_EXCLUDE = {
+        "users": {"password": 0},
+        "sessions": {"jwt": 0}
+    }
+    
+    # Fraction of find queries whose plan is explained and checked for a collection scan
+    EXPLAIN_SAMPLE_RATE = 0.01
+    
+    _indexes_ensured = False
+    _indexes_lock = threading.Lock()
+    # (document class, index keys) of REQUIRED_INDEXES known to exist, safe to hint
+    _available_indexes: set = set()
+    # Document class -> PyMongo collection handle used for generated queries (see _read_collection)
+    _read_collections: Dict[Any, Any] = {}
+    
+    def __init__(self, connection_string: str = None):
+        """
+        Initialize the NoSQL Query Executor
+        
+        Args:
+            connection_string: MongoDB connection string (defaults to MONGO_DB from .env)
+        """
+        self.connection_string = connection_string or os.getenv("MONGO_DB")
+        if not self.connection_string:
+            raise ValueError("MongoDB connection string not found. Set MONGO_DB in .env file")
+        
+        self.model_name = "gpt-4o-mini"
+        
+        # Database schema context
+        self.db_context = _DB_CONTEXT
+        
+        # Results of successful queries keyed on the query itself; sample_mflix is read-only
+        # reference data, so a repeated query within the hour returns the same rows
+        self._result_cache = ResponseCache(maxsize=1024, ttl=3600, semantic=False)
+        
+        # In-flight generate_and_execute_query calls keyed on the normalized prompt
+        self._inflight: Dict[Tuple[str, bool], Future] = {}
+        self._inflight_lock = threading.Lock()
+        
+        # The MongoDB connection, chat model, prompt and query cache are created on first use
+        # (see the properties below), so building an executor does no network or disk I/O
+    
+    def _ensure_connected(self) -> None:
+        """Connect to MongoDB using MongoEngine (shared by every executor for this connection string)"""
+        try:
+            _connect(self.connection_string)
+        except Exception as e:
+            logger.error(f"Failed to connect to MongoDB: {e}")
+            raise
+        # Create missing indexes once per process, off the request path
+        self._start_index_build()
+    
+    @cached_property
+    def model(self) -> ChatOpenAI:
+        """Chat model used for query generation"""
+        return _get_model(self.model_name, OPENAI_KEY)
+    
+    @cached_property
+    def system_prompt(self) -> str:
+        """Query-generation system prompt, padded for provider prompt caching"""
+        # It leads every request byte-for-byte, so OpenAI's automatic prefix caching can reuse it
+        return self._fit_cache_prefix(_SYSTEM_PROMPT)
+    
+    @cached_property
+    def query_prompt(self) -> ChatPromptTemplate:
+        """Prompt template; the SystemMessage is a literal (not a template) because the prompt is full of JSON braces"""
+        return ChatPromptTemplate.from_messages([
+            SystemMessage(content=self.system_prompt),
+            ("human", "Generate MongoDB query for: {prompt}")
+        ])
+    
+    @cached_property
+    def query_chain(self) -> Runnable:
+        """Prompt -> model (JSON mode, so it always returns a bare JSON object) -> MongoQuery validation"""
+        return (
+            self.query_prompt
+            | self.model.bind(prompt_cache_key="locoforge-nosql-query", response_format={"type": "json_object"})
+            | _parse_generated_query
+        )
+    
+    @cached_property
+    def _query_cache(self) -> ResponseCache:
+        """
+        Generated queries keyed on the prompt; paraphrases hit through embedding similarity,
+        exact prompts are persisted across restarts and namespaced by model and system prompt
+        so a schema or instruction change never serves a stale query
+        """
+        return ResponseCache(
+            maxsize=512,
+            ttl=3600,
+            store=open_response_store(LLM_CACHE_PATH, hash_text(self.model_name, self.system_prompt))
+        )
+    
+    @classmethod
+    def _start_index_build(cls) -> None:
+        """Start _ensure_indexes in a background thread the first time an executor connects"""
+        with cls._indexes_lock:
+            if cls._indexes_ensured:
+                return
+            cls._indexes_ensured = True
+        threading.Thread(target=cls._ensure_indexes, name="nosql-ensure-indexes", daemon=True).start()
+    
+    @classmethod
+    def _ensure_indexes(cls) -> None:
+        """Create REQUIRED_INDEXES (create_index is a no-op for indexes that already exist)"""
+        for document_class, indexes in cls.REQUIRED_INDEXES.items():
+            for keys in indexes:
+                try:
+                    document_class._get_collection().create_index(keys, background=True)
+                    cls._available_indexes.add((document_class, tuple(keys)))
+                except OperationFailure as e:
+                    logger.warning(f"Could not ensure index {keys} on {document_class._meta['collection']}: {e}")
+                    # Read-only users can't create any index; other failures (e.g. a differently
+                    # defined text index already exists) only affect this one
+                    if e.code == _UNAUTHORIZED:
+                        return
+                except Exception as e:
+                    # Unreachable servers: queries still work, just unindexed
+                    logger.warning(f"Could not ensure index {keys} on {document_class._meta['collection']}: {e}")
+                    return
+        logger.info("MongoDB indexes ensured.")
+    
+    def _fit_cache_prefix(self, prompt: str) -> str:
+        """
+        Pad the system prompt up to the provider prompt-cache threshold
+        
+        Prompts shorter than PROMPT_CACHE_MIN_TOKENS are never prefix-cached, and the
+        schema prompt sits just under it, so a few padding lines buy a cached prefix.
+        """
+        tokens = count_tokens(prompt)
+        if tokens < PROMPT_CACHE_MIN_TOKENS:
+            padding_tokens = count_tokens(_CACHE_PADDING_LINE)
+            while tokens < PROMPT_CACHE_MIN_TOKENS:
+                prompt += _CACHE_PADDING_LINE
+                tokens += padding_tokens
+        logger.info(f"NoSQL query prompt: {tokens} tokens")
+        return prompt
+    
+    def _open_cursor(self, query: str, batch_size: int, limit: Optional[int] = None) -> Iterator[Any]:
+        """
+        Parse a generated query and open a server-side cursor for it
+        
+        Args:
+            query: Aggregation ({"collection", "pipeline"}) or find ({"collection", "query", "projection"}) JSON
+            batch_size: Documents fetched per round-trip
+            limit: Optional server-side cap on the number of documents
+            
+        Returns:
+            Iterator over the raw result documents
+            
+        Raises:
+            ValueError: If the query fails validation (see _validate_query)
+        """
+        self._ensure_connected()
+        query_dict = json_utils.loads(query)
+        if isinstance(query_dict, list):
+            # Bare pipelines predate the {"collection", "pipeline"} format
+            query_dict = {"pipeline": query_dict}
+        if isinstance(query_dict, dict) and 'pipeline' in query_dict and 'collection' not in query_dict:
+            query_dict['collection'] = _infer_collection(query_dict['pipeline'])
+        _validate_query(query_dict)
+        collection_name = query_dict.get('collection', 'movies')
+        document_class = _COLLECTIONS[collection_name]
+        
+        if 'pipeline' in query_dict:
+            logger.info(f"Detected aggregation pipeline on collection: {collection_name}")
+            pipeline = self._default_pipeline_projection(collection_name, query_dict['pipeline'])
+            pipeline = _optimize_pipeline(pipeline, limit)
+            logger.info(f"Optimized pipeline: {pipeline}")
+            # Aggregate on the raw collection handle (cached on the document class by MongoEngine):
+            # a QuerySet would build a new query object per call and prepend a $match on the
+            # inheritance marker '_cls', which documents not written through MongoEngine lack
+            collection = self._read_collection(document_class)
+            return collection.aggregate(pipeline, batchSize=batch_size, allowDiskUse=self.ALLOW_DISK_USE,
+                                        maxTimeMS=self.MAX_TIME_MS)
+        
+        logger.info("Detected find query.")
+        find_query = query_dict.get('query', {})
+        projection = query_dict.get('projection') or None
+        logger.info(f"Collection: {collection_name}, Query: {find_query}, Projection: {projection}")
+        # Raw PyMongo find: results come back as plain dicts (no Document construction per row),
+        # operator values like {"$gte": ...} and dotted keys pass through unchanged, and no
+        # '_cls' filter is added (see the aggregation branch above)
+        cursor = self._read_collection(document_class).find(
+            find_query, self._find_projection(collection_name, projection, find_query), batch_size=batch_size,
+            max_time_ms=self.MAX_TIME_MS
+        )
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        hint = self._index_hint(document_class, find_query)
+        if hint:
+            cursor = cursor.hint(hint)
+        if random.random() < self.EXPLAIN_SAMPLE_RATE:
+            self._log_plan(cursor.clone(), collection_name, find_query)
+        return cursor
+    
+    @classmethod
+    def _read_collection(cls, document_class: Any) -> Any:
+        """Get the PyMongo collection behind a document class with the read preference applied"""
+        collection = cls._read_collections.get(document_class)
+        if collection is None:
+            # with_options builds a new Collection object, so build it once per class
+            collection = document_class._get_collection().with_options(read_preference=cls.READ_PREFERENCE)
+            cls._read_collections[document_class] = collection
+        return collection
     
-    def execute_query(self, query: str) -> Dict[str, Any]:
+    @classmethod
+    def _find_projection(cls, collection_name: str, projection: Optional[Dict[str, Any]],
+                         find_query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Build the PyMongo projection for a generated find query
+        
+        The projection is either all inclusions or all exclusions apart from '_id' (checked by
+        _validate_query); without any field projection the collection's DEFAULT_FIELDS (plus the
+        filtered fields, without '_id') or DEFAULT_EXCLUDE apply.
+        """
+        projection = projection or {}
+        fields = {field: value for field, value in projection.items() if field != '_id'}
+        if not fields and collection_name in cls.DEFAULT_FIELDS:
+            fields = _inclusion_projection(set(cls.DEFAULT_FIELDS[collection_name]) | _filter_paths(find_query))
+            fields['_id'] = projection.get('_id', 0)
+        elif not fields:
+            fields = dict(cls.DEFAULT_EXCLUDE.get(collection_name, {}))
+        if '_id' in projection and not projection['_id']:
+            fields['_id'] = 0
+        return fields or None
+    
+    @classmethod
+    def _default_pipeline_projection(cls, collection_name: str, pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Append the DEFAULT_FIELDS projection to a pipeline that returns whole source documents
+        
+        Only pipelines made of filter/sort/paging stages qualify; anything that reshapes the
+        documents already decides its own output fields.
+        """
+        if collection_name not in cls.DEFAULT_FIELDS \
+                or not all(next(iter(stage)) in _PASS_THROUGH_STAGES for stage in pipeline):
+            return pipeline
+        paths = set(cls.DEFAULT_FIELDS[collection_name])
+        for stage in pipeline:
+            if isinstance(stage.get("$match"), dict):
+                paths |= _filter_paths(stage["$match"])
+            elif isinstance(stage.get("$sort"), dict):
+                paths |= set(stage["$sort"])
+        return pipeline + [{"$project": {**_inclusion_projection(paths), "_id": 0}}]
+    
+    @classmethod
+    def _index_hint(cls, document_class: Any, find_query: Dict[str, Any]) -> Optional[List[Any]]:
+        """
+        Pick the index to hint for a single-field filter
+        
+        Only indexes this process created (or confirmed) are hinted, since hinting a missing
+        index makes the query fail.
+        
+        Returns:
+            Index keys led by the filtered field, or None to leave the choice to the planner
+        """
+        if len(find_query) != 1:
+            return None
+        field = next(iter(find_query))
+        if field.startswith("$"):
+            return None
+        for keys in cls.REQUIRED_INDEXES.get(document_class, []):
+            if keys[0][0] == field and keys[0][1] in (ASCENDING, DESCENDING) \
+                    and (document_class, tuple(keys)) in cls._available_indexes:
+                return keys
+        return None
+    
+    def _log_plan(self, cursor: Any, collection_name: str, find_query: Dict[str, Any]) -> None:
+        """Explain a sampled find query and warn if it scans the whole collection"""
+        try:
+            plan = json_utils.dumps(cursor.explain(), default=str)
+        except Exception as e:
+            logger.warning(f"Could not explain query on {collection_name}: {e}")
+            return
+        if '"COLLSCAN"' in plan:
+            logger.warning(f"Collection scan on {collection_name} for filter {find_query}")
+    
+    def execute_query(self, query: str, max_rows: int = DEFAULT_LIMIT, batch_size: int = 100,
+                      return_mode: str = "python") -> Dict[str, Any]:
         """
         Execute a MongoDB query using MongoEngine and return results
+        
+        Args:
+            query: Aggregation ({"collection", "pipeline"}) or find ({"collection", "query", "projection"}) JSON
+            max_rows: Maximum number of documents returned; the cursor is not drained further
+            batch_size: Documents fetched per round-trip
+            return_mode: "python" for a list of dicts in "data", or "json" for a JSON string
+                (skips parsing the encoded result back when it is only re-serialized)
         """
         logger.info(f"Received query: {query}")
         start_time = time.time()
+        cache_key = self._result_cache_key(query, max_rows, return_mode)
+        if cache_key is not None:
+            cached = self._result_cache.get("execute_query", cache_key)
+            if cached is not None:
+                logger.info("Using cached query result.")
+                # Cached rows are kept as their JSON encoding, so every caller gets its own copy
+                data = cached["data"] if return_mode == "json" else json_utils.loads(cached["data"])
+                return {**cached, "query": query, "data": data, "cached": True,
+                        "execution_time_seconds": time.time() - start_time}
         try:
-            if query.strip().startswith('['):
-                logger.info("Detected aggregation pipeline.")
-                pipeline = json.loads(query)
-                results = []
-                collections_to_try = [Movie, Comment, User, Session, Theater]
-                for collection_class in collections_to_try:
-                    try:
-                        logger.info(f"Trying aggregation on collection: {collection_class.__name__}")
-                        results = list(collection_class.objects.aggregate(pipeline))
-                        if results:
-                            logger.info(f"Aggregation returned {len(results)} results from {collection_class.__name__}")
-                            break
-                    except Exception as agg_e:
-                        logger.warning(f"Aggregation failed on {collection_class.__name__}: {agg_e}")
-                        continue
-            else:
-                logger.info("Detected find query.")
-                query_dict = json.loads(query)
-                collection_name = query_dict.get('collection', 'movies')
-                find_query = query_dict.get('query', {})
-                projection = query_dict.get('projection', {})
-                logger.info(f"Collection: {collection_name}, Query: {find_query}, Projection: {projection}")
-                collection_map = {
-                    'movies': Movie,
-                    'comments': Comment,
-                    'users': User,
-                    'sessions': Session,
-                    'theaters': Theater
-                }
-                document_class = collection_map.get(collection_name, Movie)
-                queryset = document_class.objects(**find_query)
-                # Remove '_id' from projection for MongoEngine compatibility
-                if projection and '_id' in projection:
-                    logger.info("Removing '_id' from projection for MongoEngine compatibility.")
-                    projection.pop('_id')
-                if projection:
-                    fields = {}
-                    exclude_fields = {}
-                    for field, value in projection.items():
-                        if value == 1:
-                            fields[field] = 1
-                        elif value == 0:
-                            exclude_fields[field] = 0
-                    if fields:
-                        queryset = queryset.only(*fields.keys())
-                    if exclude_fields:
-                        queryset = queryset.exclude(*exclude_fields.keys())
-                results = list(queryset)
-                logger.info(f"Find query returned {len(results)} results.")
-            def convert_to_dict(obj):
-                if hasattr(obj, 'to_mongo'):
-                    doc_dict = obj.to_mongo().to_dict()
-                    if '_id' in doc_dict:
-                        doc_dict['_id'] = str(doc_dict['_id'])
-                    return doc_dict
-                elif isinstance(obj, dict):
-                    return {k: convert_to_dict(v) for k, v in obj.items()}
-                elif isinstance(obj, list):
-                    return [convert_to_dict(item) for item in obj]
-                elif hasattr(obj, '__class__') and obj.__class__.__name__ == 'ObjectId':
-                    return str(obj)
-                elif isinstance(obj, datetime):
-                    return obj.isoformat()
-                else:
-                    return obj
-            converted_results = convert_to_dict(results)
+            # One extra document tells whether the result was truncated
+            cursor = self._open_cursor(query, batch_size, limit=max_rows + 1)
+            results = list(itertools.islice(cursor, max_rows + 1))
+            truncated = len(results) > max_rows
+            if truncated:
+                logger.info(f"Result truncated to {max_rows} documents.")
+                results = results[:max_rows]
+            encoded_results = _convert_to_dict(results, as_json=True)
+            converted_results = encoded_results if return_mode == "json" else json_utils.loads(encoded_results)
             elapsed = time.time() - start_time
             logger.info(f"Query execution completed in {elapsed:.2f} seconds.")
-            return {
+            result = {
                 "success": True,
                 "query": query,
-                "row_count": len(converted_results),
+                "row_count": len(results),
                 "data": converted_results,
+                "truncated": truncated,
                 "execution_time_seconds": elapsed
             }
+            if cache_key is not None:
+                # Store the immutable JSON string rather than the caller's mutable rows
+                self._result_cache.set("execute_query", cache_key, {**result, "data": encoded_results})
+            return result
         except Exception as e:
             elapsed = time.time() - start_time
             logger.error(f"Query failed after {elapsed:.2f} seconds: {e}")
@@ -338,110 +1217,252 @@ MongoEngine Query Patterns:
                 "execution_time_seconds": elapsed
             }
     
-    def generate_and_execute_query(self, prompt: str) -> Dict[str, Any]:
+    def _result_cache_key(self, query: str, max_rows: int, return_mode: str) -> Optional[str]:
+        """
+        Key a query's result on its parsed content, or None if the query isn't valid JSON
+        
+        Re-encoding makes whitespace irrelevant; keys are not sorted because key order is
+        significant in MongoDB ($sort specs, stage order). The digest is passed to the
+        (case-normalizing) cache as the query, so string literals keep their case.
+        """
+        try:
+            canonical = json_utils.dumps(json_utils.loads(query))
+        except ValueError:
+            return None
+        return hash_text(canonical, str(max_rows), return_mode)
+    
+    def cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Get hit/miss counters for the generated-query and query-result caches"""
+        return {
+            "query_cache": self._query_cache.stats(),
+            "result_cache": self._result_cache.stats()
+        }
+    
+    def execute_query_stream(self, query: str, batch_size: int = 100,
+                             max_rows: Optional[int] = None) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Execute a MongoDB query and yield converted results batch by batch
+        
+        Args:
+            query: Aggregation ({"collection", "pipeline"}) or find ({"collection", "query", "projection"}) JSON
+            batch_size: Documents per yielded batch (and per server round-trip)
+            max_rows: Optional cap on the total number of documents
+            
+        Yields:
+            Lists of at most batch_size converted documents
+        """
+        cursor = self._open_cursor(query, batch_size, limit=max_rows)
+        while True:
+            batch = list(itertools.islice(cursor, batch_size))
+            if not batch:
+                return
+            yield _convert_to_dict(batch)
+    
+    def generate_and_execute_query(self, prompt: str, no_cache: bool = False) -> Dict[str, Any]:
         """
         Generate MongoDB query from natural language prompt and execute it using MongoEngine
         
         Args:
             prompt: Natural language description of what data to retrieve
+            no_cache: Skip the query-cache lookup and always ask the LLM (the fresh query
+                still replaces the cached one if it runs)
             
         Returns:
             Structured response with generated query and results
         """
-        # Create system prompt with database context
-        system_prompt = """
-You are a MongoDB query generator for the Sample Mflix Database using MongoEngine ODM. 
-
-""" + self.db_context + """
-
-INSTRUCTIONS:
-1. Generate ONLY valid MongoDB queries (find operations) or aggregation pipelines
-2. Use appropriate $lookup for joining collections (e.g., comments with movies)
-3. Use $match for filtering conditions (genre, year, cast, director, etc.)
-4. Use $project for field selection
-5. Use $sort for meaningful ordering
-6. Use $limit to limit results (default 20 if not specified)
-7. Return ONLY the MongoDB query in JSON format, no explanations
-
-FOR FIND QUERIES, return format:
-{
-  "collection": "collection_name",
-  "query": { "field": "value" },
-  "projection": { "field": 1, "_id": 0 }
-}
-
-FOR AGGREGATION PIPELINES, return format:
-[
-  { "$match": { "field": "value" } },
-  { "$lookup": { "from": "collection", "localField": "field", "foreignField": "field", "as": "alias" } },
-  { "$project": { "field": 1 } }
-]
-
-EXAMPLE PROMPTS AND QUERIES:
-- "Show all movies": { "collection": "movies", "query": {}, "projection": { "title": 1, "year": 1, "genres": 1, "_id": 0 } }
-- "Movies from 2020": { "collection": "movies", "query": { "year": 2020 }, "projection": { "title": 1, "year": 1, "_id": 0 } }
-- "Action movies with high ratings": [{ "$match": { "genres": "Action", "imdb.rating": { "$gte": 7 } } }, { "$project": { "title": 1, "imdb.rating": 1, "year": 1, "_id": 0 } }, { "$sort": { "imdb.rating": -1 } }, { "$limit": 20 }]
-- "Movies with comments": [{ "$lookup": { "from": "comments", "localField": "_id", "foreignField": "movie_id", "as": "comments" } }, { "$match": { "comments": { "$ne": [] } } }, { "$project": { "title": 1, "comment_count": { "$size": "$comments" }, "_id": 0 } }, { "$sort": { "comment_count": -1 } }]
-- "Top rated directors": [{ "$unwind": "$directors" }, { "$group": { "_id": "$directors", "avg_rating": { "$avg": "$imdb.rating" }, "movie_count": { "$sum": 1 } } }, { "$match": { "avg_rating": { "$gte": 7 } } }, { "$sort": { "avg_rating": -1 } }, { "$limit": 10 }]
-"""
+        # Coalesce concurrent identical prompts: the first caller does the LLM + MongoDB work,
+        # the others wait for its result
+        key = (normalize_query(prompt), no_cache)
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            logger.info("Joining in-flight request for the same prompt.")
+            return {**future.result(), "prompt": prompt}
         
-        # Generate MongoDB query
-        messages = [
-            HumanMessage(content=f"System: {system_prompt}"),
-            HumanMessage(content=f"Generate MongoDB query for: {prompt}")
-        ]
+        try:
+            generated_query, source = self._generate_query(prompt, no_cache)
+            result = self._execute_generated(prompt, generated_query, source)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+    
+    def generate_and_execute_queries(self, prompts: List[str], max_workers: int = 4) -> List[Dict[str, Any]]:
+        """
+        Generate and execute queries for several prompts at once
         
-        response = self.model.invoke(messages)
-        generated_query = response.content.strip()
+        Uncached prompts are sent to the LLM concurrently in one batch, and the generated
+        queries run on a small thread pool, so N prompts take about as long as the slowest one.
         
-        # Clean up the query (remove markdown if present)
-        if generated_query.startswith("```json"):
-            generated_query = generated_query.replace("```json", "").replace("```", "").strip()
-        elif generated_query.startswith("```"):
-            generated_query = generated_query.replace("```", "").strip()
+        Args:
+            prompts: Natural language descriptions of what data to retrieve
+            max_workers: Maximum number of LLM requests / MongoDB queries in flight
+            
+        Returns:
+            Structured responses in prompt order (same shape as generate_and_execute_query); a
+            prompt whose query generation failed gets a failed execution_result
+        """
+        generated = self._generate_queries(prompts, max_workers)
+        queries = [query for query, _ in generated]
+        sources = [source for _, source in generated]
         
+        def run(prompt: str, query: Union[str, Exception], source: str) -> Dict[str, Any]:
+            if isinstance(query, Exception):
+                return self._generation_failed(prompt, query)
+            return self._execute_generated(prompt, query, source)
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(run, prompts, queries, sources))
+    
+    # Async variants: MongoEngine/PyMongo calls block, so run them in worker threads (which share
+    # the connection pool) and let callers fan out independent queries with asyncio.gather(...)
+    
+    async def aexecute_query(self, query: str, max_rows: int = DEFAULT_LIMIT, batch_size: int = 100,
+                             return_mode: str = "python") -> Dict[str, Any]:
+        """Async variant of execute_query"""
+        return await asyncio.to_thread(self.execute_query, query, max_rows, batch_size, return_mode)
+    
+    async def agenerate_and_execute_query(self, prompt: str, no_cache: bool = False) -> Dict[str, Any]:
+        """Async variant of generate_and_execute_query"""
+        return await asyncio.to_thread(self.generate_and_execute_query, prompt, no_cache)
+    
+    def _execute_generated(self, prompt: str, generated_query: str, source: str = _SOURCE_LLM) -> Dict[str, Any]:
+        """
+        Execute a generated query, cache it if it is new and ran, and build the structured response
+        
+        Args:
+            prompt: Prompt the query was produced for
+            generated_query: MongoDB query JSON
+            source: Where the query came from: "llm", "cache" or "fast_path"
+        """
         # Execute the generated query
         query_result = self.execute_query(generated_query)
         
+        # Only cache LLM-generated queries that actually ran
+        if query_result["success"] and source == _SOURCE_LLM:
+            self._query_cache.set("generate_query", prompt, generated_query,
+                                  context=self._cache_context(prompt))
+        
         # Return structured response
         return {
             "prompt": prompt,
             "generated_mongodb_query": generated_query,
+            "cache_hit": source == _SOURCE_CACHE,
+            "source": source,
             "execution_result": query_result,
             "timestamp": self._get_timestamp()
         }
     
+    def _generation_failed(self, prompt: str, error: Exception) -> Dict[str, Any]:
+        """Build the structured response for a prompt whose query could not be generated"""
+        logger.error(f"Query generation failed for '{prompt}': {error}")
+        return {
+            "prompt": prompt,
+            "generated_mongodb_query": None,
+            "cache_hit": False,
+            "source": _SOURCE_LLM,
+            "execution_result": {
+                "success": False,
+                "query": None,
+                "error": f"Query generation failed: {error}",
+                "data": []
+            },
+            "timestamp": self._get_timestamp()
+        }
+    
+    def _cache_context(self, prompt: str) -> str:
+        """
+        Build the query-cache context for a prompt
+        
+        Semantic matches are only looked up among prompts with the same context, so
+        including the prompt's content words keeps "Drama movies from 2000" from matching a
+        cached "Comedy movies from 2000" even though their embeddings are nearly identical.
+        """
+        return self.system_prompt + "\n" + content_words(prompt)
+    
+    def _generate_query(self, prompt: str, no_cache: bool = False) -> Tuple[str, str]:
+        """
+        Generate a MongoDB query for a prompt, reusing the cached query for a repeated prompt
+        
+        Args:
+            prompt: Natural language description of what data to retrieve
+            no_cache: Skip the cache lookup
+            
+        Returns:
+            Tuple of (MongoDB query as a JSON string, source: "fast_path" for the rule-based
+            templates, "cache" for a reused query, "llm" for a newly generated one)
+        """
+        fast = _fast_path_query(prompt)
+        if fast is not None:
+            logger.info("Using rule-based MongoDB query.")
+            return fast, _SOURCE_FAST_PATH
+        
+        cached = None if no_cache else self._query_cache.get("generate_query", prompt,
+                                                              context=self._cache_context(prompt))
+        if cached is not None:
+            logger.info("Using cached MongoDB query.")
+            return cached, _SOURCE_CACHE
+        
+        # Generate MongoDB query (validated and re-encoded by the chain)
+        return self.query_chain.invoke({"prompt": prompt}), _SOURCE_LLM
+    
+    def _generate_queries(self, prompts: List[str], max_concurrency: int = 4) -> List[Tuple[Union[str, Exception], str]]:
+        """
+        Generate MongoDB queries for several prompts, batching the cache misses into one LLM call
+        
+        Args:
+            prompts: Natural language descriptions of what data to retrieve
+            max_concurrency: Maximum number of LLM requests in flight
+            
+        Returns:
+            (generated query, source) tuples in prompt order, as returned by _generate_query; a
+            failed generation's query is the exception, so one rate-limited request doesn't
+            lose the other prompts
+        """
+        results: List[Tuple[Optional[Union[str, Exception]], str]] = [
+            (_fast_path_query(prompt), _SOURCE_FAST_PATH) for prompt in prompts
+        ]
+        # One embeddings request for all remaining prompts instead of one per semantic lookup/insert
+        self._query_cache.prefetch([prompt for prompt, (query, _) in zip(prompts, results) if query is None])
+        for i, (prompt, (query, _)) in enumerate(zip(prompts, results)):
+            if query is None:
+                results[i] = (self._query_cache.get("generate_query", prompt, context=self._cache_context(prompt)),
+                              _SOURCE_CACHE)
+        misses = [i for i, (query, _) in enumerate(results) if query is None]
+        fast = sum(source == _SOURCE_FAST_PATH for _, source in results)
+        logger.info(f"Using {fast} rule-based and {len(prompts) - fast - len(misses)} cached MongoDB queries, "
+                    f"generating {len(misses)}.")
+        if misses:
+            generated = self.query_chain.batch([{"prompt": prompts[i]} for i in misses],
+                                               config={"max_concurrency": max_concurrency},
+                                               return_exceptions=True)
+            for i, query in zip(misses, generated):
+                results[i] = (query, _SOURCE_LLM)
+        return results
+    
     def _get_timestamp(self) -> str:
         """Get current timestamp"""
         return datetime.now().isoformat()
     
     def get_sample_queries(self) -> List[str]:
         """Get sample query prompts for testing"""
-        return [
-            "Show all movies from 2020",
-            "Find action movies with high ratings",
-            "Show movies with the most comments",
-            "List top rated directors",
-            "Find movies starring Tom Hanks",
-            "Show movies with awards",
-            "List movies by genre",
-            "Find movies released in the 1990s",
-            "Show movies with high IMDB ratings",
-            "Find movies with specific cast members",
-            "Show movies with plot summaries",
-            "List movies by country",
-            "Find movies with specific directors",
-            "Show movies with runtime over 2 hours",
-            "Find movies with specific awards"
-        ]
+        return list(_SAMPLE_QUERIES)
     
     def close_connection(self):
         """Close the MongoDB connection"""
-        # MongoEngine handles connection cleanup automatically
+        # The connection is shared by every executor in the process and closed at exit
         pass
 
+@lru_cache(maxsize=1)
 def create_nosql_agent() -> NoSQLQueryExecutor:
-    """Create a pre-configured NoSQL Query Executor"""
+    """Get the pre-configured NoSQL Query Executor (created once per process)"""
     return NoSQLQueryExecutor()
 
 def interactive_nosql_chat():
@@ -459,7 +1480,7 @@ def interactive_nosql_chat():
         for i, query in enumerate(sample_queries[:5], 1):
             print(f"{i}. {query}")
         
-        print("\nType 'quit' to exit, 'samples' to see more examples")
+        print("\nType 'quit' to exit, 'samples' to see more examples, 'run samples' to run them all")
         print("-" * 50)
         
         while True:
@@ -474,6 +1495,13 @@ def interactive_nosql_chat():
                     for i, query in enumerate(sample_queries, 1):
                         print(f"{i}. {query}")
                     continue
+                elif user_input.lower() == 'run samples':
+                    print(f"🤖 Generating {len(sample_queries)} MongoDB queries...")
+                    for result in agent.generate_and_execute_queries(sample_queries):
+                        execution = result["execution_result"]
+                        status = f"{execution['row_count']} rows" if execution["success"] else f"failed: {execution.get('error')}"
+                        print(f"- {result['prompt']}: {status}")
+                    continue
                 elif not user_input:
                     continue
                 
@@ -483,7 +1511,7 @@ def interactive_nosql_chat():
                 
                 # Display results in structured format
                 print("\n📊 RESULTS:")
-                print(json.dumps(result, indent=2, default=str))
+                print(json_utils.dumps(result, indent=True, default=str))
                 
             except KeyboardInterrupt:
                 print("\n\n👋 Goodbye!")
@@ -500,7 +1528,7 @@ def interactive_nosql_chat():
 
 if __name__ == "__main__":
     # Check if required environment variables are available
-    if not os.getenv("OPENAPI_KEY"):
+    if not OPENAI_KEY:
         print("❌ Error: OPENAPI_KEY not found in environment variables")
         print("Please make sure your .env file contains: OPENAPI_KEY=your_api_key_here")
         exit(1)
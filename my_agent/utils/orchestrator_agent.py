@@ -6,20 +6,23 @@ Combines Intent Classification, Query Decomposition, Result Aggregation, and Con
 import os
 import json
 import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from typing import Dict, List, Any, Optional, Tuple
-from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from my_agent.utils.state import OrchestratorState, QueryDomain, QueryIntent
-from my_agent.utils.nosql_agent import NoSQLQueryExecutor
+from my_agent.utils.llm_cache import ResponseCache, content_words
+from my_agent.utils.env import OPENAI_KEY, load_env
+from my_agent.utils.nosql_agent import NoSQLQueryExecutor, create_nosql_agent
 
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
-
 # Import agents with error handling
 try:
     from my_agent.utils.sql_agent import SQLQueryExecutor
@@ -36,14 +39,144 @@ except Exception as e:
     SQL_AVAILABLE = False
 
 try:
-    from my_agent.utils.nosql_agent import NoSQLQueryExecutor
+    from my_agent.utils.nosql_agent import NoSQLQueryExecutor, create_nosql_agent
     NOSQL_AVAILABLE = True
 except ImportError as e:
     print(f"Warning: NoSQL agent not available: {e}")
     NOSQL_AVAILABLE = False
 
+# Keywords for the fallback classifier, matched as whole words
+_EMPLOYEE_KEYWORDS = frozenset({
+    "employee", "employees", "staff", "department", "departments",
+    "salary", "salaries", "attendance", "project", "projects",
+    "manager", "managers", "hire", "hired",
+    "position", "positions", "first name", "last name"
+})
+_MOVIE_KEYWORDS = frozenset({
+    "movie", "movies", "rating", "ratings", "comment", "comments",
+    "theater", "theaters", "cast", "director", "directors",
+    "genre", "genres", "year", "award", "awards"
+})
+
+def _keyword_pattern(keywords: frozenset) -> "re.Pattern":
+    """Compile keywords into one alternation, so a query is scanned once instead of once per keyword"""
+    alternation = "|".join(re.escape(keyword) for keyword in sorted(keywords, key=lambda k: (-len(k), k)))
+    return re.compile(rf"\b(?:{alternation})\b")
+
+_EMPLOYEE_KEYWORD_RE = _keyword_pattern(_EMPLOYEE_KEYWORDS)
+_MOVIE_KEYWORD_RE = _keyword_pattern(_MOVIE_KEYWORDS)
+
+# Direct SQL detection for execute_sql_query, one case-insensitive scan each
+_SQL_START_RE = re.compile(r"\s*(SELECT|INSERT|UPDATE|DELETE|CREATE|DROP|ALTER|DESCRIBE|EXPLAIN|USE)\b", re.I)
+_SQL_SYNTAX_RE = re.compile(r"\b(?:FROM|WHERE|JOIN|GROUP\s+BY|ORDER\s+BY|LIMIT)\b|;", re.I)
+_SQL_DML_KEYWORDS = frozenset({"SELECT", "INSERT", "UPDATE", "DELETE"})
+
+# Minimum seconds between attempts to re-initialize a missing SQL agent
+_SQL_REINIT_INTERVAL = 30
+
+# Static system prompts; only the human turn varies per request, so every classification /
+# decomposition request starts with the same bytes (provider prefix caching can reuse them)
+_CLASSIFY_SYSTEM_PROMPT = """
+You are an expert query classifier for a hybrid database system with:
+1. SQL Database: Employee management (employees, departments, projects, attendance, salary, titles)
+2. NoSQL Database: Sample Mflix (movies, comments, users, theaters)
+
+Classify the query into:
+- DOMAIN: employee, movies, hybrid, unknown
+- INTENT: select, analyze, compare, aggregate
+
+EXAMPLES:
+- "Show all employees in IT department" → {"domain": "employee", "intent": "select"}
+- "List all employees first name" → {"domain": "employee", "intent": "select"}
+- "Find employees with salary above 50000" → {"domain": "employee", "intent": "select"}
+- "Show employee names and departments" → {"domain": "employee", "intent": "select"}
+- "Get all employees" → {"domain": "employee", "intent": "select"}
+- "Display employee information" → {"domain": "employee", "intent": "select"}
+- "Find action movies with high ratings" → {"domain": "movies", "intent": "select"}
+- "Show movies from 2020" → {"domain": "movies", "intent": "select"}
+- "Find employees who watched action movies" → {"domain": "hybrid", "intent": "select"}
+- "Compare department budgets with movie ratings" → {"domain": "hybrid", "intent": "compare"}
+- "Show which employees commented on action movies" → {"domain": "hybrid", "intent": "select"}
+
+EMPLOYEE DOMAIN KEYWORDS: employee, employees, staff, department, departments, salary, salaries, attendance, project, projects, manager, managers, hire, hired, title, titles, position, positions
+
+MOVIE DOMAIN KEYWORDS: movie, movies, rating, ratings, comment, comments, theater, theaters, cast, director, directors, genre, genres, year, award, awards
+
+HYBRID QUERIES combine employee data (attendance, departments, projects) with movie data (movies, comments, ratings).
+
+Return ONLY a JSON object with "domain" and "intent" fields.
+"""
+
+_DECOMPOSE_SYSTEM_PROMPT = """
+You are an expert at decomposing hybrid database queries into separate sub-queries for different database systems.
+
+TASK: Decompose the given hybrid query into two separate sub-queries:
+1. SQL sub-query: Focus ONLY on employee data (employees, departments, projects, attendance)
+2. NoSQL sub-query: Focus ONLY on movie data (movies, comments, users, theaters)
+
+IMPORTANT RULES:
+- Each sub-query should be focused on its specific domain
+- SQL sub-query should NOT mention movie/comment data
+- NoSQL sub-query should NOT mention employee/attendance data
+- Both sub-queries should be complete, actionable queries
+- Do NOT include the other domain's data in each sub-query
+
+EXAMPLES:
+
+Query: "Find employees who watched action movies"
+- SQL: "Get all employee information"
+- NoSQL: "Find action movies"
+
+Query: "Show which employees commented on action movies"
+- SQL: "Get all employee information"
+- NoSQL: "Find comments on action movies"
+
+Query: "Compare department budgets with movie ratings"
+- SQL: "Get department budgets"
+- NoSQL: "Calculate average movie ratings"
+
+Query: "Find employees in IT department who watched high-rated movies"
+- SQL: "Find employees in IT department"
+- NoSQL: "Find movies with high ratings"
+
+Query: "Show projects managed by employees who watched action movies"
+- SQL: "Get all projects and their managers"
+- NoSQL: "Find action movies"
+
+Return ONLY a JSON object with "sql" and "nosql" fields containing the decomposed sub-queries.
+"""
+
+_CLASSIFY_SYSTEM_MESSAGE = SystemMessage(content=_CLASSIFY_SYSTEM_PROMPT)
+_DECOMPOSE_SYSTEM_MESSAGE = SystemMessage(content=_DECOMPOSE_SYSTEM_PROMPT)
+
 class HybridOrchestrator:
-    """Hybrid Orchestrator that manages SQL and NoSQL agents with intelligent routing"""
+    """
+    Hybrid Orchestrator that manages SQL and NoSQL agents with intelligent routing
+    
+    Construction is expensive (agent initialization, database connections, LLM clients), so
+    callers should share one instance through HybridOrchestrator.instance(). The request
+    methods (classify_intent, decompose_query, execute_*, aggregate_results) keep no
+    per-request state on the instance and are safe to call concurrently; conversation context
+    lives in the OrchestratorState passed by the graph.
+    """
+    
+    _instance: Optional["HybridOrchestrator"] = None
+    _instance_lock = threading.Lock()
+    
+    @classmethod
+    def instance(cls) -> "HybridOrchestrator":
+        """Get the shared orchestrator, creating it on first use (thread-safe)"""
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+    
+    @classmethod
+    def reset_instance(cls) -> None:
+        """Drop the shared orchestrator so the next instance() call builds a fresh one"""
+        with cls._instance_lock:
+            cls._instance = None
     
     def __init__(self):
         """Initialize the orchestrator with both agents"""
@@ -51,45 +184,22 @@ class HybridOrchestrator:
         self.sql_agent = None
         self.nosql_agent = None
         
-        # Load environment variables explicitly with multiple attempts
-        load_dotenv()
-        
-        # Additional environment loading for LangGraph Studio
-        env_file_paths = ['.env', '../.env', '../../.env']
-        for env_path in env_file_paths:
-            if os.path.exists(env_path):
-                load_dotenv(env_path)
-                logger.info(f"Loaded environment from: {env_path}")
+        # Load the .env file(s) once per process (no-op after the first call)
+        load_env()
         
         # Verify environment variables
         mongo_db = os.getenv("MONGO_DB")
-        openai_key = os.getenv("OPENAPI_KEY") or os.getenv("OPENAI_API_KEY")
         postgres_db_url = os.getenv("POSTGRES_DB_URL")
         
         logger.info(f"Environment check - MONGO_DB: {'SET' if mongo_db else 'NOT SET'}")
-        logger.info(f"Environment check - OPENAPI_KEY: {'SET' if openai_key else 'NOT SET'}")
+        logger.info(f"Environment check - OPENAPI_KEY: {'SET' if OPENAI_KEY else 'NOT SET'}")
         logger.info(f"Environment check - POSTGRES_DB_URL: {'SET' if postgres_db_url else 'NOT SET'}")
         
+        # Serializes SQL agent (re-)initialization; monotonic time of the last attempt
+        self._sql_init_lock = threading.Lock()
+        self._sql_init_at = 0.0
         if SQL_AVAILABLE:
-            try:
-                # Use the new SQL agent manager for robust initialization
-                from my_agent.utils.sql_agent_manager import initialize_sql_agent, get_sql_manager
-                
-                logger.info("🔄 Initializing SQL agent using manager...")
-                if initialize_sql_agent():
-                    manager = get_sql_manager()
-                    self.sql_agent = manager.agent
-                    logger.info("✅ SQL agent initialized successfully via manager")
-                else:
-                    logger.error("❌ SQL agent initialization failed via manager")
-                    self.sql_agent = None
-                    
-            except Exception as e:
-                logger.error(f"❌ Failed to initialize SQL agent: {e}")
-                logger.error(f"Error type: {type(e).__name__}")
-                import traceback
-                logger.error(f"Full traceback: {traceback.format_exc()}")
-                self.sql_agent = None
+            self._init_sql_agent()
         
         if NOSQL_AVAILABLE:
             try:
@@ -99,7 +209,7 @@ class HybridOrchestrator:
                     logger.warning("Available environment variables: " + str([k for k in os.environ.keys() if 'MONGO' in k or 'DB' in k]))
                 else:
                     logger.info(f"Initializing NoSQL agent with connection: {mongo_db}")
-                    self.nosql_agent = NoSQLQueryExecutor()
+                    self.nosql_agent = create_nosql_agent()
                     logger.info("✅ NoSQL agent initialized successfully")
             except Exception as e:
                 logger.warning(f"Warning: Failed to initialize NoSQL agent: {e}")
@@ -111,23 +221,80 @@ class HybridOrchestrator:
         
         self.model = ChatOpenAI(
             model="gpt-4o-mini",
-            api_key=os.getenv("OPENAPI_KEY") or os.getenv("OPENAI_API_KEY")
+            temperature=0,
+            api_key=OPENAI_KEY
         )
-        
-        # Domain keywords for classification
+        # JSON mode always returns a parseable object; the token caps fit the small answers
+        # ({"domain", "intent"} / {"sql", "nosql"}) and stop runaway generations early
+        self.classifier_model = self.model.bind(response_format={"type": "json_object"}, max_tokens=40,
+                                                prompt_cache_key="locoforge-classify")
+        self.decomposer_model = self.model.bind(response_format={"type": "json_object"}, max_tokens=150,
+                                                prompt_cache_key="locoforge-decompose")
+        
+        # Domain keywords for classification (shared module-level sets)
         self.domain_keywords = {
-            QueryDomain.EMPLOYEE: [
-                "employee", "staff", "department", "salary", "manager", "hire", 
-                "attendance", "project", "position", "budget", "performance"
-            ],
-            QueryDomain.MOVIES: [
-                "movie", "movies", "rating", "ratings", "comment", "comments", "theater", "theaters",
-                "cast", "director", "directors", "genre", "genres", "year", "award", "awards"
-            ]
+            QueryDomain.EMPLOYEE: _EMPLOYEE_KEYWORDS,
+            QueryDomain.MOVIES: _MOVIE_KEYWORDS
         }
         
         # Context window for conversation history
         self.context_window = 5
+        
+        # Parsed LLM classifications keyed on the query; near-duplicates with the same content
+        # words ("show all employees" / "list all employees") hit through embedding similarity
+        self._intent_cache = ResponseCache(maxsize=1024, ttl=3600, similarity=0.92)
+        
+        # Parsed LLM decompositions keyed on the normalized query (exact only: a paraphrase with
+        # different filters must not reuse another query's sub-queries)
+        self._llm_cache = ResponseCache(maxsize=1024, ttl=3600, semantic=False)
+    
+    def _init_sql_agent(self) -> None:
+        """Initialize the SQL agent through the shared SQL agent manager"""
+        self._sql_init_at = time.monotonic()
+        try:
+            # Use the new SQL agent manager for robust initialization
+            from my_agent.utils.sql_agent_manager import initialize_sql_agent, get_sql_manager
+            
+            logger.info("🔄 Initializing SQL agent using manager...")
+            if initialize_sql_agent():
+                manager = get_sql_manager()
+                self.sql_agent = manager.agent
+                logger.info("✅ SQL agent initialized successfully via manager")
+            else:
+                logger.error("❌ SQL agent initialization failed via manager")
+                self.sql_agent = None
+                
+        except Exception as e:
+            logger.error(f"❌ Failed to initialize SQL agent: {e}")
+            logger.error(f"Error type: {type(e).__name__}")
+            import traceback
+            logger.error(f"Full traceback: {traceback.format_exc()}")
+            self.sql_agent = None
+    
+    def ensure_sql_agent(self) -> bool:
+        """
+        Re-initialize the SQL agent if it is missing, keeping the rest of the orchestrator
+        (NoSQL agent, LLM clients, caches) as it is
+        
+        Attempts are spaced at least _SQL_REINIT_INTERVAL seconds apart, so an unreachable
+        database doesn't add an initialization attempt to every request.
+        
+        Returns:
+            Whether the SQL agent is available
+        """
+        if not SQL_AVAILABLE:
+            return False
+        try:
+            from my_agent.utils.sql_agent_manager import get_sql_agent_status
+            if self.sql_agent is not None and get_sql_agent_status().get("initialized", False):
+                return True
+        except Exception as e:
+            logger.warning(f"Could not check SQL agent status: {e}")
+        
+        with self._sql_init_lock:
+            if time.monotonic() - self._sql_init_at >= _SQL_REINIT_INTERVAL:
+                self._init_sql_agent()
+        return self.sql_agent is not None
     
     def classify_intent(self, query: str) -> Tuple[QueryDomain, QueryIntent]:
         """
@@ -146,50 +313,29 @@ class HybridOrchestrator:
         
         # If keyword classification fails, try LLM-based classification
         try:
-            system_prompt = """
-You are an expert query classifier for a hybrid database system with:
-1. SQL Database: Employee management (employees, departments, projects, attendance, salary, titles)
-2. NoSQL Database: Sample Mflix (movies, comments, users, theaters)
-
-Classify the query into:
-- DOMAIN: employee, movies, hybrid, unknown
-- INTENT: select, analyze, compare, aggregate
-
-EXAMPLES:
-- "Show all employees in IT department" → {"domain": "employee", "intent": "select"}
-- "List all employees first name" → {"domain": "employee", "intent": "select"}
-- "Find employees with salary above 50000" → {"domain": "employee", "intent": "select"}
-- "Show employee names and departments" → {"domain": "employee", "intent": "select"}
-- "Get all employees" → {"domain": "employee", "intent": "select"}
-- "Display employee information" → {"domain": "employee", "intent": "select"}
-- "Find action movies with high ratings" → {"domain": "movies", "intent": "select"}
-- "Show movies from 2020" → {"domain": "movies", "intent": "select"}
-- "Find employees who watched action movies" → {"domain": "hybrid", "intent": "select"}
-- "Compare department budgets with movie ratings" → {"domain": "hybrid", "intent": "compare"}
-- "Show which employees commented on action movies" → {"domain": "hybrid", "intent": "select"}
-
-EMPLOYEE DOMAIN KEYWORDS: employee, employees, staff, department, departments, salary, salaries, attendance, project, projects, manager, managers, hire, hired, title, titles, position, positions
-
-MOVIE DOMAIN KEYWORDS: movie, movies, rating, ratings, comment, comments, theater, theaters, cast, director, directors, genre, genres, year, award, awards
-
-HYBRID QUERIES combine employee data (attendance, departments, projects) with movie data (movies, comments, ratings).
-
-Return ONLY a JSON object with "domain" and "intent" fields.
-"""
+            # Semantic hits only among queries with the same content words ("delete" vs
+            # "show" employees must not share an intent)
+            cache_context = _CLASSIFY_SYSTEM_PROMPT + "\n" + content_words(query)
+            cached = self._intent_cache.get("classify_intent", query, context=cache_context)
+            if cached is not None:
+                return QueryDomain(cached[0]), QueryIntent(cached[1])
             
             messages = [
-                SystemMessage(content=system_prompt),
+                _CLASSIFY_SYSTEM_MESSAGE,
                 HumanMessage(content=f"Classify this query: {query}")
             ]
             
-            response = self.model.invoke(messages)
+            response = self.classifier_model.invoke(messages)
             
             try:
                 classification = json.loads(response.content)
                 domain = QueryDomain(classification.get("domain", "unknown"))
                 intent = QueryIntent(classification.get("intent", "select"))
+                self._intent_cache.set("classify_intent", query, [domain.value, intent.value],
+                                       context=cache_context)
                 return domain, intent
-            except:
+            except (ValueError, AttributeError):
+                # Invalid JSON, a non-object, or an unknown domain/intent value
                 return QueryDomain.UNKNOWN, QueryIntent.SELECT
         except Exception as e:
             logger.warning(f"LLM classification failed: {e}, using keyword fallback")
@@ -207,31 +353,16 @@ Return ONLY a JSON object with "domain" and "intent" fields.
         """
         query_lower = query.lower()
         
-        # Employee domain keywords
-        employee_keywords = [
-            "employee", "employees", "staff", "department", "departments", 
-            "salary", "salaries", "attendance", "project", "projects", 
-            "manager", "managers", "hire", "hired", 
-            "position", "positions", "first name", "last name"
-        ]
-        
-        # Movie domain keywords
-        movie_keywords = [
-            "movie", "movies", "rating", "ratings", "comment", "comments", 
-            "theater", "theaters", "cast", "director", "directors", 
-            "genre", "genres", "year", "award", "awards"
-        ]
-        
-        # Check for employee keywords (exact word matching to avoid false positives)
-        employee_count = sum(1 for keyword in employee_keywords if f" {keyword} " in f" {query_lower} " or query_lower.startswith(f"{keyword} ") or query_lower.endswith(f" {keyword}"))
-        movie_count = sum(1 for keyword in movie_keywords if f" {keyword} " in f" {query_lower} " or query_lower.startswith(f"{keyword} ") or query_lower.endswith(f" {keyword}"))
+        # One scan per domain; whole-word matching avoids false positives ("cast" in "forecast")
+        has_employee = _EMPLOYEE_KEYWORD_RE.search(query_lower) is not None
+        has_movie = _MOVIE_KEYWORD_RE.search(query_lower) is not None
         
         # Determine domain based on keyword presence
-        if employee_count > 0 and movie_count == 0:
+        if has_employee and not has_movie:
             return QueryDomain.EMPLOYEE, QueryIntent.SELECT
-        elif movie_count > 0 and employee_count == 0:
+        elif has_movie and not has_employee:
             return QueryDomain.MOVIES, QueryIntent.SELECT
-        elif employee_count > 0 and movie_count > 0:
+        elif has_employee and has_movie:
             return QueryDomain.HYBRID, QueryIntent.SELECT
         else:
             return QueryDomain.UNKNOWN, QueryIntent.SELECT
@@ -254,51 +385,16 @@ Return ONLY a JSON object with "domain" and "intent" fields.
     
     def _decompose_hybrid_query(self, query: str) -> Dict[str, str]:
         """Decompose hybrid queries into domain-specific sub-queries"""
-        system_prompt = """
-You are an expert at decomposing hybrid database queries into separate sub-queries for different database systems.
-
-TASK: Decompose the given hybrid query into two separate sub-queries:
-1. SQL sub-query: Focus ONLY on employee data (employees, departments, projects, attendance)
-2. NoSQL sub-query: Focus ONLY on movie data (movies, comments, users, theaters)
-
-IMPORTANT RULES:
-- Each sub-query should be focused on its specific domain
-- SQL sub-query should NOT mention movie/comment data
-- NoSQL sub-query should NOT mention employee/attendance data
-- Both sub-queries should be complete, actionable queries
-- Do NOT include the other domain's data in each sub-query
-
-EXAMPLES:
-
-Query: "Find employees who watched action movies"
-- SQL: "Get all employee information"
-- NoSQL: "Find action movies"
-
-Query: "Show which employees commented on action movies"
-- SQL: "Get all employee information"
-- NoSQL: "Find comments on action movies"
-
-Query: "Compare department budgets with movie ratings"
-- SQL: "Get department budgets"
-- NoSQL: "Calculate average movie ratings"
-
-Query: "Find employees in IT department who watched high-rated movies"
-- SQL: "Find employees in IT department"
-- NoSQL: "Find movies with high ratings"
-
-Query: "Show projects managed by employees who watched action movies"
-- SQL: "Get all projects and their managers"
-- NoSQL: "Find action movies"
-
-Return ONLY a JSON object with "sql" and "nosql" fields containing the decomposed sub-queries.
-"""
+        cached = self._llm_cache.get("decompose_hybrid_query", query, context=_DECOMPOSE_SYSTEM_PROMPT)
+        if cached is not None:
+            return dict(cached)
         
         messages = [
-            SystemMessage(content=system_prompt),
+            _DECOMPOSE_SYSTEM_MESSAGE,
             HumanMessage(content=f"Decompose this hybrid query: {query}")
         ]
         
-        response = self.model.invoke(messages)
+        response = self.decomposer_model.invoke(messages)
         
         try:
             decomposition = json.loads(response.content)
@@ -310,11 +406,13 @@ Return ONLY a JSON object with "sql" and "nosql" fields containing the decompose
                 # Fallback to manual decomposition
                 return self._manual_decompose_hybrid_query(query)
             
-            return {
+            decomposition = {
                 "sql": sql_query,
                 "nosql": nosql_query
             }
-        except:
+            self._llm_cache.set("decompose_hybrid_query", query, decomposition, context=_DECOMPOSE_SYSTEM_PROMPT)
+            return dict(decomposition)
+        except (ValueError, AttributeError):
             # Fallback to manual decomposition
             return self._manual_decompose_hybrid_query(query)
     
@@ -322,23 +420,6 @@ Return ONLY a JSON object with "sql" and "nosql" fields containing the decompose
         """Manual fallback decomposition for hybrid queries"""
         query_lower = query.lower()
         
-        # Extract employee-related parts
-        employee_keywords = ["employees", "employee", "attendance", "department", "departments", "project", "projects", "manager", "managers"]
-        sql_parts = []
-        
-        # Extract movie-related parts
-        movie_keywords = ["movies", "movie", "rating", "ratings", "comment", "comments", "theater", "theaters", "cast", "director", "directors", "genre", "genres"]
-        nosql_parts = []
-        
-        # Simple keyword-based decomposition
-        words = query.split()
-        for word in words:
-            word_clean = word.lower().strip(".,!?")
-            if word_clean in employee_keywords:
-                sql_parts.append(word)
-            elif word_clean in movie_keywords:
-                nosql_parts.append(word)
-        
         # Create basic sub-queries
         if "attendance" in query_lower and "perfect" in query_lower:
             sql_query = "Find employees with perfect attendance records"
@@ -367,30 +448,13 @@ Return ONLY a JSON object with "sql" and "nosql" fields containing the decompose
             # Use the SQL agent manager for robust execution
             from my_agent.utils.sql_agent_manager import generate_and_execute_sql, execute_sql_query as manager_execute_sql
             
-            # Check if this is already a SQL query (starts with SQL keywords)
-            sql_keywords = ['SELECT', 'INSERT', 'UPDATE', 'DELETE', 'CREATE', 'DROP', 'ALTER', 'DESCRIBE', 'EXPLAIN', 'USE']
-            query_upper = query.strip().upper()
-            
-            # Check if it starts with a SQL keyword AND has SQL-like syntax
-            starts_with_sql_keyword = any(query_upper.startswith(keyword) for keyword in sql_keywords)
-            
-            # Additional checks for SQL-like syntax
-            has_sql_syntax = (
-                'FROM' in query_upper or 
-                'WHERE' in query_upper or 
-                'JOIN' in query_upper or 
-                'GROUP BY' in query_upper or
-                'ORDER BY' in query_upper or
-                'LIMIT' in query_upper or
-                ';' in query or
-                query_upper.startswith('SELECT') or
-                query_upper.startswith('INSERT') or
-                query_upper.startswith('UPDATE') or
-                query_upper.startswith('DELETE')
+            # Already a SQL query: starts with a SQL keyword AND has SQL-like syntax (DML
+            # statements count as SQL syntax on their own)
+            start = _SQL_START_RE.match(query)
+            is_direct_sql = start is not None and (
+                start.group(1).upper() in _SQL_DML_KEYWORDS or _SQL_SYNTAX_RE.search(query) is not None
             )
             
-            is_direct_sql = starts_with_sql_keyword and has_sql_syntax
-            
             logger.info(f"[DEBUG] execute_sql_query - Input query: '{query}'")
             logger.info(f"[DEBUG] execute_sql_query - Is direct SQL: {is_direct_sql}")
             
@@ -434,6 +498,24 @@ Return ONLY a JSON object with "sql" and "nosql" fields containing the decompose
         except Exception as e:
             return {"success": False, "error": str(e), "data": []}
     
+    def execute_hybrid(self, sub_queries: Dict[str, str]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Execute the SQL and NoSQL sub-queries of a hybrid query concurrently
+        
+        Both are dominated by LLM and database round-trips, so the hybrid query takes about
+        as long as the slower of the two instead of their sum.
+        
+        Args:
+            sub_queries: Decomposition with "sql" and "nosql" sub-queries
+            
+        Returns:
+            Tuple of (SQL results, NoSQL results)
+        """
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            sql_future = executor.submit(self.execute_sql_query, sub_queries["sql"])
+            nosql_future = executor.submit(self.execute_nosql_query, sub_queries["nosql"])
+            return sql_future.result(), nosql_future.result()
+    
     def aggregate_results(self, sql_results: Dict[str, Any], 
                          nosql_results: Dict[str, Any], 
                          original_query: str) -> Dict[str, Any]:
@@ -506,7 +588,6 @@ Return ONLY a JSON object with "sql" and "nosql" fields containing the decompose
     
     def _get_timestamp(self) -> str:
         """Get current timestamp"""
-        from datetime import datetime
         return datetime.now().isoformat()
     
     def update_context(self, state: OrchestratorState) -> OrchestratorState:
@@ -568,9 +649,11 @@ Return ONLY a JSON object with "sql" and "nosql" fields containing the decompose
                 "initialized": self.nosql_agent is not None,
                 "status": "✅ Ready" if self.nosql_agent else "❌ Not initialized"
             },
+            "intent_cache": self._intent_cache.stats(),
+            "llm_cache": self._llm_cache.stats(),
             "environment": {
                 "mongo_db": os.getenv("MONGO_DB", "NOT SET"),
-                "openai_key": "SET" if os.getenv("OPENAPI_KEY") else "NOT SET",
+                "openai_key": "SET" if OPENAI_KEY else "NOT SET",
                 "postgres_db_url": os.getenv("POSTGRES_DB_URL", "NOT SET")
             }
         }
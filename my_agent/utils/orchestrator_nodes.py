@@ -6,79 +6,40 @@ from typing import Dict, Any
 from my_agent.utils.state import OrchestratorState, QueryDomain, QueryIntent, QueryComplexity
 from my_agent.utils.orchestrator_agent import HybridOrchestrator, SQL_AVAILABLE
 from my_agent.utils.data_engineer_agent import DataEngineerAgent
+from my_agent.utils import json_utils
+from my_agent.utils.env import load_env
 import json
 import os
 import logging
-from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
 
 # Set up logging for LangGraph Studio
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load environment variables explicitly for LangGraph Studio
-load_dotenv()
+# Load environment variables explicitly for LangGraph Studio (no-op if already loaded)
+load_env()
 
-# Initialize orchestrator with lazy loading
-_orchestrator_instance = None
+# Initialize data engineer with lazy loading (the orchestrator is shared via HybridOrchestrator.instance())
 _data_engineer_instance = None
 
 def get_orchestrator():
-    """Get or create orchestrator instance with proper error handling"""
-    global _orchestrator_instance
-    
-    # Use cached instance if available and SQL agent is working
-    if _orchestrator_instance is not None:
-        try:
-            # Check if SQL agent is still working
-            from my_agent.utils.sql_agent_manager import get_sql_agent_status
-            sql_status = get_sql_agent_status()
-            if sql_status.get("initialized", False):
-                logger.info("🔄 Using cached orchestrator instance")
-                return _orchestrator_instance
-        except Exception as e:
-            logger.warning(f"Could not check SQL agent status: {e}")
-    
-    # Create a fresh instance
+    """Get the shared orchestrator instance, re-initializing a missing SQL agent in place"""
     try:
-        logger.info("🔄 Creating fresh orchestrator instance for LangGraph Studio...")
-        
-        # Force reload environment variables
-        load_dotenv()
-        
-        # Create orchestrator - let agents handle their own initialization
-        orchestrator = HybridOrchestrator()
-        
-        # Log initialization status
-        status = orchestrator.check_agent_status()
-        
-        if status['sql_agent']['initialized']:
-            logger.info("✅ SQL agent initialized successfully")
-        else:
-            logger.warning(f"⚠️  SQL agent not initialized: {status['sql_agent'].get('error', 'Unknown error')}")
-            
-        if status['nosql_agent']['initialized']:
-            logger.info("✅ NoSQL agent initialized successfully")
-        else:
-            logger.warning(f"⚠️  NoSQL agent not initialized: {status['nosql_agent'].get('error', 'Unknown error')}")
-        
-        # Cache the successful instance
-        _orchestrator_instance = orchestrator
-        return orchestrator
-            
+        orchestrator = HybridOrchestrator.instance()
     except Exception as e:
         logger.error(f"❌ Failed to initialize orchestrator: {e}")
         import traceback
         logger.error(traceback.format_exc())
         
-        # If we have a cached instance, try to use it
-        if _orchestrator_instance is not None:
-            logger.info("🔄 Using cached orchestrator instance")
-            return _orchestrator_instance
-        
-        # Create a minimal orchestrator instance for error handling
+        # Retry once (agent failures are handled inside the constructor)
         logger.info("🔄 Creating minimal orchestrator instance")
-        _orchestrator_instance = HybridOrchestrator()
-        return _orchestrator_instance
+        orchestrator = HybridOrchestrator.instance()
+    
+    # Retry a failed SQL agent without discarding the orchestrator's clients and caches
+    if SQL_AVAILABLE and not orchestrator.ensure_sql_agent():
+        logger.warning("⚠️  SQL agent not initialized")
+    return orchestrator
 
 def get_data_engineer():
     """Get or create data engineer agent instance"""
@@ -100,8 +61,8 @@ def get_data_engineer():
 
 def reset_orchestrator():
     """Force re-initialization of the orchestrator (useful for LangGraph Studio)"""
-    global _orchestrator_instance, _data_engineer_instance
-    _orchestrator_instance = None
+    global _data_engineer_instance
+    HybridOrchestrator.reset_instance()
     _data_engineer_instance = None
     logger.info("🔄 Orchestrator and Data Engineer reset - will re-initialize on next use")
     return get_orchestrator()
@@ -120,7 +81,7 @@ def check_orchestrator_status():
         
         # Add detailed SQL agent diagnostics
         if data_engineer:
-            sql_diagnosis = data_engineer._diagnose_sql_agent_issue()
+            sql_diagnosis = data_engineer._diagnose_sql_agent_issue(check_executor=True)
             status["sql_agent_diagnosis"] = sql_diagnosis
         
         return status
@@ -265,17 +226,19 @@ def classify_query_node(state: OrchestratorState) -> OrchestratorState:
         
         # Handle specific query types with Data Engineer Agent
         if query_type == "ambiguous":
-            response = data_engineer.handle_ambiguous_query(query, analysis)
-            state["data_engineer_response"] = response
-            # Also generate clarification suggestions for additional help
-            suggestions = data_engineer.provide_clarification_suggestions(query, analysis)
-            state["clarification_suggestions"] = suggestions
+            # The response and the clarification suggestions are independent LLM calls,
+            # so run them concurrently
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                response_future = executor.submit(data_engineer.handle_ambiguous_query, query, analysis)
+                suggestions_future = executor.submit(data_engineer.provide_clarification_suggestions, query, analysis)
+                state["data_engineer_response"] = response_future.result().to_dict()
+                state["clarification_suggestions"] = suggestions_future.result()
         elif query_type == "technical":
             response = data_engineer.handle_technical_query(query)
-            state["data_engineer_response"] = response
+            state["data_engineer_response"] = response.to_dict()
         elif query_type == "non_domain":
             response = data_engineer.handle_non_domain_query(query)
-            state["data_engineer_response"] = response
+            state["data_engineer_response"] = response.to_dict()
         
         state["execution_path"].append("classify_query")
         return state
@@ -487,13 +450,13 @@ def data_engineer_node(state: OrchestratorState) -> OrchestratorState:
             "success": True,
             "original_query": query,
             "query_type": "sql_guidance",
-            "response": result.get("response", "SQL agent is not available"),
-            "execution_result": result.get("execution_result", {
+            "response": result.response or "SQL agent is not available",
+            "execution_result": result.execution_result or {
                 "success": False,
                 "error": "SQL agent is not available due to missing dependencies",
                 "row_count": 0,
                 "data": []
-            }),
+            },
             "timestamp": get_orchestrator()._get_timestamp()
         }
         
@@ -550,6 +513,39 @@ What specific information would you like to see?"""
     state["execution_path"].append("data_engineer")
     return state
 
+def _sql_fallback_to_data_engineer(state: OrchestratorState, sql_query: str) -> None:
+    """Answer a SQL query with Data Engineer guidance when the SQL agent is unavailable"""
+    logger.warning("SQL agent is None in orchestrator, routing to data engineer")
+    data_engineer = get_data_engineer()
+    result = data_engineer.handle_sql_query_without_agent(sql_query)
+    
+    state["combined_results"] = {
+        "success": True,
+        "original_query": state["current_query"],
+        "query_type": "sql_guidance",
+        "response": result.response or "SQL agent is not available",
+        "execution_result": result.execution_result or {
+            "success": False,
+            "error": "SQL agent is not available due to missing dependencies",
+            "row_count": 0,
+            "data": []
+        },
+        "timestamp": get_orchestrator()._get_timestamp()
+    }
+    
+    state["execution_path"].append("sql_agent_fallback_to_data_engineer")
+
+def _execute_sql(orchestrator: HybridOrchestrator, sql_query: str) -> Dict[str, Any]:
+    """Execute a SQL query, turning unexpected errors into a failed result"""
+    try:
+        return orchestrator.execute_sql_query(sql_query)
+    except Exception as e:
+        return {
+            "success": False, 
+            "error": f"SQL execution failed: {str(e)}",
+            "execution_result": {"success": False, "error": str(e)}
+        }
+
 def sql_agent_node(state: OrchestratorState) -> OrchestratorState:
     """Node: Execute SQL queries using SQL agent"""
     # Initialize state if needed
@@ -574,25 +570,7 @@ def sql_agent_node(state: OrchestratorState) -> OrchestratorState:
             # Check if SQL agent is actually available
             if orchestrator.sql_agent is None:
                 # SQL agent is not available, route to data engineer
-                logger.warning("SQL agent is None in orchestrator, routing to data engineer")
-                data_engineer = get_data_engineer()
-                result = data_engineer.handle_sql_query_without_agent(sql_query)
-                
-                state["combined_results"] = {
-                    "success": True,
-                    "original_query": state["current_query"],
-                    "query_type": "sql_guidance",
-                    "response": result.get("response", "SQL agent is not available"),
-                    "execution_result": result.get("execution_result", {
-                        "success": False,
-                        "error": "SQL agent is not available due to missing dependencies",
-                        "row_count": 0,
-                        "data": []
-                    }),
-                    "timestamp": get_orchestrator()._get_timestamp()
-                }
-                
-                state["execution_path"].append("sql_agent_fallback_to_data_engineer")
+                _sql_fallback_to_data_engineer(state, sql_query)
                 return state
             
             # SQL agent is available, execute the query
@@ -641,6 +619,52 @@ def nosql_agent_node(state: OrchestratorState) -> OrchestratorState:
     state["execution_path"].append("nosql_agent")
     return state
 
+def hybrid_agents_node(state: OrchestratorState) -> OrchestratorState:
+    """Node: Execute the SQL and NoSQL sub-queries of a hybrid query (concurrently when both exist)"""
+    # Initialize state if needed
+    state = initialize_state(state)
+    
+    sub_queries = state["sub_queries"]
+    sql_query = sub_queries.get("sql", "")
+    nosql_query = sub_queries.get("nosql", "")
+    if isinstance(nosql_query, dict) and 'content' in nosql_query:
+        nosql_query = nosql_query['content']
+    orchestrator = get_orchestrator()
+    
+    # Without a SQL agent the SQL half gets Data Engineer guidance; the NoSQL half still runs
+    if sql_query and orchestrator.sql_agent is None:
+        _sql_fallback_to_data_engineer(state, sql_query)
+        state["sql_results"] = {
+            "success": False,
+            "error": "SQL agent is not available",
+            "execution_result": state["combined_results"]["execution_result"]
+        }
+        sql_query = ""
+
+    if sql_query and nosql_query:
+        try:
+            state["sql_results"], state["nosql_results"] = orchestrator.execute_hybrid(
+                {"sql": sql_query, "nosql": nosql_query}
+            )
+        except Exception as e:
+            # Fall back to running the halves one after the other so one failure doesn't lose both
+            logger.warning(f"Concurrent hybrid execution failed, running sub-queries separately: {e}")
+            state["sql_results"] = _execute_sql(orchestrator, sql_query)
+            state["nosql_results"] = orchestrator.execute_nosql_query(nosql_query)
+    else:
+        if sql_query:
+            state["sql_results"] = _execute_sql(orchestrator, sql_query)
+        elif not sub_queries.get("sql"):
+            state["sql_results"] = {"success": False, "error": "No SQL query provided"}
+        
+        if nosql_query:
+            state["nosql_results"] = orchestrator.execute_nosql_query(nosql_query)
+        else:
+            state["nosql_results"] = {"success": False, "error": "No NoSQL query provided"}
+    
+    state["execution_path"].append("hybrid_agents")
+    return state
+
 def aggregate_results_node(state: OrchestratorState) -> OrchestratorState:
     """Node: Aggregate results from multiple agents"""
     # Initialize state if needed
@@ -811,7 +835,7 @@ def format_success_response_markdown(results: dict, original_query: str) -> str:
             # Add data in JSON code block
             if "data" in sql_data and sql_data["data"]:
                 markdown += "**Results:**\n"
-                markdown += f"```json\n{json.dumps(sql_data['data'], indent=2, default=str)}\n```\n\n"
+                markdown += f"```json\n{json_utils.dumps(sql_data['data'], indent=True, default=str)}\n```\n\n"
             else:
                 markdown += "**Results:** No data returned\n\n"
         else:
@@ -836,7 +860,7 @@ def format_success_response_markdown(results: dict, original_query: str) -> str:
             # Add data in JSON code block
             if "data" in nosql_data and nosql_data["data"]:
                 markdown += "**Results:**\n"
-                markdown += f"```json\n{json.dumps(nosql_data['data'], indent=2, default=str)}\n```\n\n"
+                markdown += f"```json\n{json_utils.dumps(nosql_data['data'], indent=True, default=str)}\n```\n\n"
             else:
                 markdown += "**Results:** No data returned\n\n"
         else:
@@ -872,7 +896,7 @@ def format_success_response_markdown(results: dict, original_query: str) -> str:
     # Handle hybrid results (combined from multiple sources)
     if "combined_data" in results:
         markdown += "## Combined Results\n\n"
-        markdown += f"```json\n{json.dumps(results['combined_data'], indent=2, default=str)}\n```\n\n"
+        markdown += f"```json\n{json_utils.dumps(results['combined_data'], indent=True, default=str)}\n```\n\n"
     
     # Add execution summary if available
     if "execution_path" in results:
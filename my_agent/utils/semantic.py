@@ -0,0 +1,84 @@
+"""
+Shared embedding helpers for semantic routing and caching
+Uses OpenAI embeddings through LangChain with a single shared client
+"""
+
+import math
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+from langchain_openai import OpenAIEmbeddings
+from my_agent.utils.env import OPENAI_KEY
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+@lru_cache(maxsize=1)
+def get_embeddings() -> OpenAIEmbeddings:
+    """Get the shared embeddings client"""
+    return OpenAIEmbeddings(
+        model=EMBEDDING_MODEL,
+        api_key=OPENAI_KEY
+    )
+
+def normalize_vector(vector: Sequence[float]) -> List[float]:
+    """Scale a vector to unit length so dot products are cosine similarities"""
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+def embed_texts(texts: Sequence[str]) -> List[List[float]]:
+    """Embed several texts with one API call and return unit-length vectors"""
+    return [normalize_vector(vector) for vector in get_embeddings().embed_documents(list(texts))]
+
+# Memoized unit-length embeddings per text (LRU)
+_EMBEDDING_CACHE_SIZE = 1024
+_embedding_cache: "OrderedDict[str, Tuple[float, ...]]" = OrderedDict()
+_embedding_lock = threading.Lock()
+
+def _get_cached(text: str) -> Optional[Tuple[float, ...]]:
+    with _embedding_lock:
+        vector = _embedding_cache.get(text)
+        if vector is not None:
+            _embedding_cache.move_to_end(text)
+        return vector
+
+def _put_cached(text: str, vector: Tuple[float, ...]) -> None:
+    with _embedding_lock:
+        _embedding_cache[text] = vector
+        _embedding_cache.move_to_end(text)
+        while len(_embedding_cache) > _EMBEDDING_CACHE_SIZE:
+            _embedding_cache.popitem(last=False)
+
+def embed_text(text: str) -> List[float]:
+    """Embed a single text and return a unit-length vector (memoized per text)"""
+    vector = _get_cached(text)
+    if vector is None:
+        vector = tuple(normalize_vector(get_embeddings().embed_query(text)))
+        _put_cached(text, vector)
+    return list(vector)
+
+def prefetch_embeddings(texts: Sequence[str]) -> None:
+    """Embed the texts not memoized yet with one API call, so later embed_text calls are free"""
+    missing = [text for text in dict.fromkeys(texts) if _get_cached(text) is None]
+    if not missing:
+        return
+    for text, vector in zip(missing, embed_texts(missing)):
+        _put_cached(text, tuple(vector))
+
+def best_match(vector: Sequence[float], candidates: Sequence[Sequence[float]]) -> Tuple[int, float]:
+    """
+    Find the most similar candidate for a unit-length vector
+
+    Returns:
+        Tuple of (index, cosine similarity), or (-1, 0.0) if there are no candidates
+    """
+    best_index, best_score = -1, 0.0
+    for index, candidate in enumerate(candidates):
+        score = sum(a * b for a, b in zip(vector, candidate))
+        if best_index == -1 or score > best_score:
+            best_index, best_score = index, score
+    return best_index, best_score
@@ -9,6 +9,7 @@ import os
 import json
 import asyncio
 import asyncpg
+from datetime import datetime
 from typing import Dict, List, Any, Optional
 from dotenv import load_dotenv
 from openai import OpenAI
@@ -384,7 +385,6 @@ EXAMPLE PROMPTS AND QUERIES:
     
     def _get_timestamp(self) -> str:
         """Get current timestamp"""
-        from datetime import datetime
         return datetime.now().isoformat()
     
     def get_sample_queries(self) -> List[str]:
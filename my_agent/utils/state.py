@@ -1,5 +1,6 @@
 from typing import List, TypedDict, Dict, Any, Optional, Annotated
 from langchain_core.messages import BaseMessage
+from langgraph.graph.message import add_messages
 from enum import Enum
 
 class QueryDomain(Enum):
@@ -38,8 +39,8 @@ class OrchestratorState(TypedDict):
     execution_path: List[str]
     error_message: Optional[str]
     clarification_suggestions: Optional[List[str]]  # New field for query refinement
-    data_engineer_response: Optional[str]  # New field for data engineer agent responses
+    data_engineer_response: Optional[Dict[str, Any]]  # New field for data engineer agent responses
 
 class ChatState(TypedDict):
     """State for the chat application."""
-    messages: Annotated[List[BaseMessage], "add"] 
\ No newline at end of file
+    messages: Annotated[List[BaseMessage], add_messages] 
\ No newline at end of file
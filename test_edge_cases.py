@@ -202,10 +202,10 @@ def test_data_engineer_agent_directly():
             print(f"💡 Suggestions: {suggestions}")
         elif query_type == "technical":
             response = agent.handle_technical_query(query)
-            print(f"🔧 Technical Response: {response.get('response', 'No response')[:100]}...")
+            print(f"🔧 Technical Response: {(response.response or 'No response')[:100]}...")
         elif query_type == "non_domain":
             response = agent.handle_non_domain_query(query)
-            print(f"🌍 Non-Domain Response: {response.get('response', 'No response')[:100]}...")
+            print(f"🌍 Non-Domain Response: {(response.response or 'No response')[:100]}...")
 
 if __name__ == "__main__":
     print("🚀 Enhanced Edge Case Handling System")
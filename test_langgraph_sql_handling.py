@@ -42,8 +42,8 @@ def simulate_langgraph_environment():
         data_engineer = DataEngineerAgent()
         result = data_engineer.handle_sql_query_without_agent("Show all employees")
         
-        print(f"✅ Data Engineer SQL handling: {result.get('success', False)}")
-        print(f"   Query type: {result.get('query_type', 'unknown')}")
+        print(f"✅ Data Engineer SQL handling: {result.success}")
+        print(f"   Query type: {result.query_type}")
         
         # Test orchestrator
         from my_agent.utils.orchestrator_agent import HybridOrchestrator
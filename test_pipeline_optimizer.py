@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Test script for the NoSQL agent's aggregation pipeline rewriter and query validator
+Runs offline: only the pure pipeline helpers are exercised, no MongoDB or LLM calls
+"""
+
+import sys
+
+# Add the my_agent directory to the path
+sys.path.append('my_agent')
+
+from my_agent.utils.nosql_agent import _optimize_pipeline, _apply_limit, _validate_query
+
+COMMENTS_LOOKUP = {"$lookup": {"from": "comments", "localField": "_id", "foreignField": "movie_id", "as": "comments"}}
+
+def test_match_not_hoisted_past_producing_lookup():
+    """A $match on the field a $lookup produces must stay after the $lookup"""
+    pipeline = [COMMENTS_LOOKUP, {"$match": {"comments.name": "Mercedes Tyler"}}]
+    assert _optimize_pipeline(pipeline) == pipeline
+
+def test_match_hoisted_above_unrelated_lookup():
+    """A $match on source fields runs before the $lookup"""
+    pipeline = [COMMENTS_LOOKUP, {"$match": {"year": 2000}}]
+    assert _optimize_pipeline(pipeline) == [{"$match": {"year": 2000}}, COMMENTS_LOOKUP]
+
+def test_match_not_hoisted_past_producing_unwind():
+    """A $match on the unwound field (or the array index) must stay after the $unwind"""
+    pipeline = [{"$unwind": "$genres"}, {"$match": {"genres": "Drama"}}]
+    assert _optimize_pipeline(pipeline) == pipeline
+
+    pipeline = [{"$unwind": {"path": "$cast", "includeArrayIndex": "billing"}}, {"$match": {"billing": 0}}]
+    assert _optimize_pipeline(pipeline) == pipeline
+
+def test_match_not_hoisted_past_group():
+    """A $match after a $group filters the groups, not the source documents"""
+    pipeline = [{"$group": {"_id": "$year", "count": {"$sum": 1}}}, {"$match": {"_id": 2000}}]
+    assert _optimize_pipeline(pipeline) == pipeline
+
+def test_match_hoisting_through_project():
+    """A $match moves above a $project that keeps its fields, but not above one that computes them"""
+    project = {"$project": {"title": 1, "year": 1}}
+    assert _optimize_pipeline([project, {"$match": {"year": 2000}}]) == [{"$match": {"year": 2000}}, project]
+
+    computed = {"$project": {"year": {"$add": ["$year", 1]}}}
+    pipeline = [computed, {"$match": {"year": 2000}}]
+    assert _optimize_pipeline(pipeline) == pipeline
+
+    excluded = {"$project": {"year": 0}}
+    pipeline = [excluded, {"$match": {"year": {"$exists": False}}}]
+    assert _optimize_pipeline(pipeline) == pipeline
+
+def test_unanalyzable_match_stays_put():
+    """A $match using $expr can't be analyzed, so it is never moved"""
+    pipeline = [COMMENTS_LOOKUP, {"$match": {"$expr": {"$gt": ["$year", 2000]}}}]
+    assert _optimize_pipeline(pipeline) == pipeline
+
+def test_adjacent_matches_merged():
+    """Adjacent $match stages merge into one, using $and when their fields overlap"""
+    pipeline = [{"$match": {"year": 2000}}, {"$match": {"genres": "Drama"}}]
+    assert _optimize_pipeline(pipeline) == [{"$match": {"year": 2000, "genres": "Drama"}}]
+
+    # Filters commute, so the clause order inside $and is not significant
+    pipeline = [{"$match": {"year": {"$gte": 2000}}}, {"$match": {"year": {"$lt": 2010}}}]
+    optimized = _optimize_pipeline(pipeline)
+    assert len(optimized) == 1 and list(optimized[0]["$match"]) == ["$and"]
+    clauses = optimized[0]["$match"]["$and"]
+    assert sorted(clauses, key=str) == sorted([{"year": {"$gte": 2000}}, {"year": {"$lt": 2010}}], key=str)
+
+def test_hoisted_match_merged_with_leading_match():
+    """A hoisted $match lands next to an earlier one and the two are merged"""
+    pipeline = [{"$match": {"year": 2000}}, COMMENTS_LOOKUP, {"$match": {"genres": "Drama"}}]
+    assert _optimize_pipeline(pipeline) == [{"$match": {"year": 2000, "genres": "Drama"}}, COMMENTS_LOOKUP]
+
+def test_project_inlined_into_group():
+    """A renaming $project before a $group is folded into the group's field references"""
+    pipeline = [
+        {"$project": {"genre": "$genres", "rating": "$imdb.rating"}},
+        {"$group": {"_id": "$genre", "avg_rating": {"$avg": "$rating"}}}
+    ]
+    assert _optimize_pipeline(pipeline) == [{"$group": {"_id": "$genres", "avg_rating": {"$avg": "$imdb.rating"}}}]
+
+def test_project_not_inlined_when_it_computes_or_drops_fields():
+    """The $project stays when it computes a value or the $group reads a field it dropped"""
+    pipeline = [
+        {"$project": {"rating": {"$multiply": ["$imdb.rating", 10]}}},
+        {"$group": {"_id": None, "avg_rating": {"$avg": "$rating"}}}
+    ]
+    assert _optimize_pipeline(pipeline) == pipeline
+
+    pipeline = [
+        {"$project": {"genre": "$genres"}},
+        {"$group": {"_id": "$year", "count": {"$sum": 1}}}
+    ]
+    assert _optimize_pipeline(pipeline) == pipeline
+
+def test_singleton_array_lookup_flattened():
+    """{"$arrayElemAt": [[expr], 0]} is replaced with expr"""
+    pipeline = [{"$project": {"first": {"$arrayElemAt": [["$title"], 0]}}}]
+    assert _optimize_pipeline(pipeline) == [{"$project": {"first": "$title"}}]
+
+def test_limit_placed_after_sort():
+    """The $limit goes right after a $sort followed only by one-to-one stages (top-k sort)"""
+    pipeline = [{"$sort": {"imdb.rating": -1}}, {"$project": {"title": 1}}]
+    assert _apply_limit(pipeline, 10) == [{"$sort": {"imdb.rating": -1}}, {"$limit": 10}, {"$project": {"title": 1}}]
+
+def test_limit_appended_when_group_follows_sort():
+    """A $group after the $sort changes the document count, so the $limit goes at the end"""
+    pipeline = [{"$sort": {"year": 1}}, {"$group": {"_id": "$year", "count": {"$sum": 1}}}]
+    assert _apply_limit(pipeline, 10) == pipeline + [{"$limit": 10}]
+
+    pipeline = [{"$match": {"year": 2000}}, {"$project": {"title": 1}}]
+    assert _apply_limit(pipeline, 5) == pipeline + [{"$limit": 5}]
+
+def test_existing_limit_kept():
+    """A pipeline that already has a $limit is left alone"""
+    pipeline = [{"$sort": {"year": 1}}, {"$limit": 3}, {"$project": {"title": 1}}]
+    assert _apply_limit(pipeline, 10) == pipeline
+    assert _optimize_pipeline(pipeline, limit=10) == pipeline
+
+def test_validate_query_accepts_read_only_queries():
+    """Allowlisted stages and mixed-free projections pass validation"""
+    _validate_query({"collection": "movies", "pipeline": [
+        {"$match": {"year": 2000}}, COMMENTS_LOOKUP, {"$sort": {"year": -1}}, {"$limit": 5}
+    ]})
+    _validate_query({"collection": "movies", "query": {"year": 2000}, "projection": {"_id": 0, "title": 1}})
+    _validate_query({"collection": "users", "query": {}, "projection": {"password": 0}})
+
+def expect_rejected(query_dict):
+    """Assert that _validate_query raises ValueError for a query"""
+    try:
+        _validate_query(query_dict)
+    except ValueError:
+        return
+    raise AssertionError(f"Query was not rejected: {query_dict}")
+
+def test_validate_query_rejects_unsafe_or_malformed_queries():
+    """Writes, server-side JavaScript, unknown stages and malformed queries are rejected"""
+    expect_rejected([{"$match": {}}])
+    expect_rejected({"collection": "accounts", "query": {}})
+    expect_rejected({"collection": "movies", "pipeline": {"$match": {}}})
+    expect_rejected({"collection": "movies", "pipeline": [{"$match": {}, "$limit": 5}]})
+    expect_rejected({"collection": "movies", "pipeline": [{"$out": "movies_copy"}]})
+    expect_rejected({"collection": "movies", "pipeline": [{"$merge": {"into": "movies_copy"}}]})
+    expect_rejected({"collection": "movies", "pipeline": [{"$limit": 0}]})
+    expect_rejected({"collection": "movies", "pipeline": [{"$limit": True}]})
+    expect_rejected({"collection": "movies", "query": {"$where": "this.year > 2000"}})
+    expect_rejected({"collection": "movies", "pipeline": [
+        {"$facet": {"nested": [{"$lookup": {"from": "users", "pipeline": [{"$out": "x"}], "as": "u"}}]}}
+    ]})
+    expect_rejected({"collection": "movies", "pipeline": [
+        {"$group": {"_id": None, "js": {"$accumulator": {"init": "function() {}"}}}}
+    ]})
+    expect_rejected({"collection": "movies", "query": [], "projection": {}})
+    expect_rejected({"collection": "movies", "query": {}, "projection": {"title": 1, "plot": 0}})
+
+def main():
+    """Run all tests"""
+    print("🚀 NoSQL Pipeline Optimizer Test Suite")
+    print("=" * 50)
+
+    tests = [value for name, value in globals().items() if name.startswith("test_") and callable(value)]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {e}")
+
+    print("\n" + "=" * 50)
+    print(f"📊 Test Summary: {len(tests) - failed}/{len(tests)} passed")
+    return failed == 0
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -52,8 +52,8 @@ def test_sql_agent_graceful_handling():
         data_engineer = DataEngineerAgent()
         result = data_engineer.handle_sql_query_without_agent("Show all employees")
         
-        print(f"✅ Data Engineer SQL handling: {result.get('success', False)}")
-        print(f"   Query type: {result.get('query_type', 'unknown')}")
+        print(f"✅ Data Engineer SQL handling: {result.success}")
+        print(f"   Query type: {result.query_type}")
         
     except Exception as e:
         print(f"❌ Data Engineer test failed: {e}")